@@ -0,0 +1,323 @@
+"""
+Set-based analytics helpers.
+
+Spending is summed in the database, grouped by the columns the responses need,
+and currency conversion is applied once per group instead of once per expense.
+Groups are dated, so each is converted at the rate of its date by an
+ExpenseConverter (api/base_amounts.py), like the expense list and exports:
+groups whose expenses all carry a base-currency amount are taken from
+SUM(amount_base), other groups from their original currency, and spending
+already in the viewer's currency is never converted. Trip budgets are
+converted at today's rate.
+Each report is split into its reads and a pure build step, so the async views
+share the build step and only swap in async ORM and rate calls.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import logging
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncWeek, TruncMonth
+
+from .base_amounts import ExpenseConverter
+from .exchange_rates import track_rate_usage
+from .models import Trip, Expense
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+
+def grouped_spending(trip_ids):
+    """
+    One grouped query over all expenses of the given trips:
+    (trip, original_currency, category, date) -> SUM(amount), SUM(amount_base)
+    and the number of expenses without a base amount
+    """
+    return (
+        Expense.objects.filter(trip_id__in=trip_ids)
+        .values('trip_id', 'original_currency', 'category', 'date')
+        .annotate(
+            total=Sum('amount'),
+            total_base=Sum('amount_base'),
+            unbased_count=Count('id', filter=Q(amount_base__isnull=True)),
+        )
+        .order_by('trip_id', 'date')
+    )
+
+
+def _base_total(group):
+    # Only groups whose every expense has a base amount are converted from it
+    return group['total_base'] if group['unbased_count'] == 0 else None
+
+
+def _need_rates(converter, trips, groups, currency_field):
+    for group in groups:
+        converter.need(group[currency_field], group['date'], _base_total(group) is not None)
+    for trip in trips:
+        converter.need(trip.currency)
+    return converter
+
+
+def _convert_group(converter, group, currency_field):
+    return converter.convert(group['total'], group[currency_field], group['date'], _base_total(group))
+
+
+SERIES_BUCKETS = ('day', 'week', 'month')
+
+
+def _bucket_start(day, bucket):
+    # Weeks start on Monday to match TruncWeek
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, bucket):
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _bucket_label(day, bucket):
+    if bucket == 'month':
+        return day.strftime("%Y-%m")
+    return day.strftime("%Y-%m-%d")
+
+
+def spending_series(trip, bucket='day'):
+    """
+    Spending per day, week (keyed by its Monday) or month ("YYYY-MM") between
+    the trip dates. One GROUP BY query over the trip's spending rollup; buckets
+    without expenses are filled with 0.0 in memory, so the query count does
+    not grow with trip length.
+    """
+    if bucket not in SERIES_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(SERIES_BUCKETS)}")
+
+    rollups = trip.spending_rollups.filter(date__range=(trip.start_date, trip.end_date))
+    period_field = 'date'
+    if bucket == 'week':
+        rollups = rollups.annotate(period=TruncWeek('date'))
+        period_field = 'period'
+    elif bucket == 'month':
+        rollups = rollups.annotate(period=TruncMonth('date'))
+        period_field = 'period'
+    totals = {
+        row[period_field]: row['sum_total']
+        for row in rollups.values(period_field).annotate(sum_total=Sum('total')).order_by()
+    }
+
+    series = {}
+    current = _bucket_start(trip.start_date, bucket)
+    while current <= trip.end_date:
+        series[_bucket_label(current, bucket)] = float(totals.get(current) or 0)
+        current = _next_bucket(current, bucket)
+    return series
+
+
+def trip_rollup_rows(trip):
+    """The trip's spending rollup rows that trip analytics are built from"""
+    return trip.spending_rollups.values('category', 'date', 'currency', 'total', 'total_base', 'unbased_count')
+
+
+def trip_analytics(trip, user):
+    """
+    Analytics for one trip converted to the user's currency, read from the
+    trip's spending rollup: one query over O(categories x days) rows, and
+    one for the stored rates of their dates.
+    """
+    rows = list(trip_rollup_rows(trip))
+    converter = ExpenseConverter.load(user.currency, {row['currency'] for row in rows}, (row['date'] for row in rows))
+    with track_rate_usage() as usage:
+        _need_rates(converter, [trip], rows, 'currency').resolve()
+    return build_trip_analytics(trip, user, rows, converter, usage.stale)
+
+
+async def atrip_analytics(trip, user):
+    """Async trip_analytics"""
+    rows = [row async for row in trip_rollup_rows(trip)]
+    converter = await ExpenseConverter.aload(
+        user.currency, {row['currency'] for row in rows}, (row['date'] for row in rows)
+    )
+    with track_rate_usage() as usage:
+        await _need_rates(converter, [trip], rows, 'currency').aresolve()
+    return build_trip_analytics(trip, user, rows, converter, usage.stale)
+
+
+def _money(value):
+    # Decimal sums are rounded once, here, on the way out
+    return float(value.quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def build_trip_analytics(trip, user, rows, converter, rates_stale=False):
+    """
+    The trip analytics response from its rollup rows and a resolved
+    ExpenseConverter. Each (category, date, currency) row is converted at
+    its date's rate, all in Decimal; nothing is rounded before the output.
+    Amounts without a rate stay unconverted, as before.
+    `rates_stale` says whether any rate came from a stale fallback table.
+    """
+    total_spent = Decimal(0)
+    category_spending = defaultdict(Decimal)
+    daily_spending = defaultdict(Decimal)
+    for row in rows:
+        amount, _ = _convert_group(converter, row, 'currency')
+        total_spent += amount
+        category_spending[row['category']] += amount
+        daily_spending[row['date']] += amount
+
+    # Convert trip budget if needed
+    total_budget, _ = converter.convert(trip.total_budget, trip.currency)
+
+    # Calculate duration and daily average
+    duration = (trip.end_date - trip.start_date).days + 1
+    daily_avg = total_spent / duration if duration > 0 else Decimal(0)
+
+    return {
+        'trip_id': trip.id,
+        'trip_name': trip.trip_name,
+        'destination': trip.destination,
+        'start_date': trip.start_date.strftime("%Y-%m-%d"),
+        'end_date': trip.end_date.strftime("%Y-%m-%d"),
+        'total_budget': _money(total_budget),
+        'total_spent': _money(total_spent),
+        'remaining_budget': _money(total_budget - total_spent),
+        'daily_average': _money(daily_avg),
+        'category_spending': {k: _money(v) for k, v in category_spending.items()},
+        'daily_spending': {k.strftime("%Y-%m-%d"): _money(daily_spending[k]) for k in sorted(daily_spending)},
+        'user_currency': user.currency,
+        'trip_currency': trip.currency,
+        'is_converted': user.currency != trip.currency,
+        'rates_stale': rates_stale,
+    }
+
+
+def all_trips_analytics(user):
+    """
+    Aggregated analytics across every trip the user owns or collaborates on,
+    converted to the user's currency. Returns None if the user has no trips.
+    Runs three queries however many trips and expenses there are.
+    """
+    trips = list(Trip.objects.accessible_by(user))
+    if not trips:
+        return None
+
+    groups = list(grouped_spending([trip.id for trip in trips]))
+    converter = ExpenseConverter.load(
+        user.currency, {group['original_currency'] for group in groups}, (group['date'] for group in groups)
+    )
+    with track_rate_usage() as usage:
+        _need_rates(converter, trips, groups, 'original_currency').resolve()
+    return build_all_trips_analytics(user, trips, groups, converter, usage.stale)
+
+
+async def aall_trips_analytics(user):
+    """Async all_trips_analytics"""
+    trips = [trip async for trip in Trip.objects.accessible_by(user)]
+    if not trips:
+        return None
+
+    groups = [group async for group in grouped_spending([trip.id for trip in trips])]
+    converter = await ExpenseConverter.aload(
+        user.currency, {group['original_currency'] for group in groups}, (group['date'] for group in groups)
+    )
+    with track_rate_usage() as usage:
+        await _need_rates(converter, trips, groups, 'original_currency').aresolve()
+    return build_all_trips_analytics(user, trips, groups, converter, usage.stale)
+
+
+def build_all_trips_analytics(user, trips, groups, converter, rates_stale=False):
+    """The all-trips analytics response from the trips, grouped spending and a resolved ExpenseConverter"""
+    response_data = {
+        'total_budget': 0,
+        'total_spent': 0,
+        'remaining_budget': 0,
+        'categories': defaultdict(float),
+        'daily_spending': defaultdict(float),
+        'trips': [],
+        'user_currency': user.currency,
+        'is_converted': False,
+        'rates_stale': rates_stale,
+    }
+
+    groups_by_trip = defaultdict(list)
+    for group in groups:
+        groups_by_trip[group['trip_id']].append(group)
+
+    for trip in trips:
+        trip_data = {
+            'trip_id': trip.id,
+            'trip_name': trip.trip_name,
+            'destination': trip.destination,
+            'start_date': trip.start_date.strftime("%Y-%m-%d"),
+            'end_date': trip.end_date.strftime("%Y-%m-%d"),
+            'total_budget': float(trip.total_budget),
+            'total_spent': 0,
+            'remaining_budget': 0,
+            'daily_average': 0,
+            'category_spending': defaultdict(float),
+            'is_converted': False
+        }
+
+        # Convert trip budget if needed
+        budget, currency = converter.convert(trip.total_budget, trip.currency)
+        if trip.currency != user.currency and currency == user.currency:
+            trip_data['total_budget'] = float(budget)
+            trip_data['is_converted'] = True
+            response_data['is_converted'] = True
+
+        trip_groups = groups_by_trip.get(trip.id, [])
+        if trip_groups:
+            trip_data['daily_spending'] = defaultdict(float)
+
+        for group in trip_groups:
+            # Convert the group total at its date's rate if needed
+            amount, currency = _convert_group(converter, group, 'original_currency')
+            amount = float(amount)
+            if currency == user.currency and group['original_currency'] != user.currency:
+                trip_data['is_converted'] = True
+                response_data['is_converted'] = True
+
+            date_str = group['date'].strftime("%Y-%m-%d")
+            trip_data['total_spent'] += amount
+            trip_data['category_spending'][group['category']] += amount
+            trip_data['daily_spending'][date_str] += amount
+            response_data['daily_spending'][date_str] += amount
+
+        # Calculate remaining budget and daily average
+        trip_data['remaining_budget'] = trip_data['total_budget'] - trip_data['total_spent']
+        duration = (trip.end_date - trip.start_date).days + 1
+        trip_data['daily_average'] = trip_data['total_spent'] / duration if duration > 0 else 0
+
+        # Round trip data
+        trip_data['total_budget'] = round(trip_data['total_budget'], 2)
+        trip_data['total_spent'] = round(trip_data['total_spent'], 2)
+        trip_data['remaining_budget'] = round(trip_data['remaining_budget'], 2)
+        trip_data['daily_average'] = round(trip_data['daily_average'], 2)
+        trip_data['category_spending'] = {k: round(v, 2) for k, v in trip_data['category_spending'].items()}
+        if 'daily_spending' in trip_data:
+            trip_data['daily_spending'] = {k: round(v, 2) for k, v in trip_data['daily_spending'].items()}
+
+        # Add to totals
+        response_data['total_budget'] += trip_data['total_budget']
+        response_data['total_spent'] += trip_data['total_spent']
+        for category, amount in trip_data['category_spending'].items():
+            response_data['categories'][category] += amount
+
+        response_data['trips'].append(trip_data)
+
+    # Calculate remaining budget and round all values
+    response_data['remaining_budget'] = round(response_data['total_budget'] - response_data['total_spent'], 2)
+    response_data['total_budget'] = round(response_data['total_budget'], 2)
+    response_data['total_spent'] = round(response_data['total_spent'], 2)
+    response_data['categories'] = {k: round(v, 2) for k, v in response_data['categories'].items()}
+    response_data['daily_spending'] = {k: round(v, 2) for k, v in response_data['daily_spending'].items()}
+
+    return response_data
@@ -0,0 +1,131 @@
+"""
+Async versions of the analytics and budget recommendation views for ASGI
+deployments (e.g. uvicorn backend.asgi:application).
+
+DRF's APIView is synchronous, so these are plain Django async views with the
+same JWT authentication, URLs under /api/async/ and the same response bodies
+as their sync counterparts. Database reads use the async ORM and rates come
+from the async, single-flight methods of the rate service, so a slow rate
+provider holds up only the requests waiting on it, not the worker.
+"""
+
+import hashlib
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .analytics import atrip_analytics, aall_trips_analytics
+from .budget import arecommend_budget, CityNotFound
+from .membership import ais_trip_member
+from .models import Trip
+from .rate_history import ahistory_version
+from .response_cache import acached_analytics
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAPIView(View):
+    """JWT-authenticated async view; like APIView, exempt from CSRF"""
+    authentication = JWTAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await sync_to_async(self.authentication.authenticate)(request)
+        except AuthenticationFailed as e:
+            return self._unauthorized(e.detail if isinstance(e.detail, dict) else {'detail': e.detail})
+        if authenticated is None:
+            return self._unauthorized({'detail': "Authentication credentials were not provided."})
+
+        request.user = authenticated[0]
+        return await super().dispatch(request, *args, **kwargs)
+
+    def _unauthorized(self, body):
+        response = JsonResponse(body, status=401)
+        response['WWW-Authenticate'] = self.authentication.authenticate_header(self.request)
+        return response
+
+
+# ANALYTICS VIEWS
+class AsyncAllTripsAnalyticsView(AsyncAPIView):
+    #Async AllTripsAnalyticsView
+    async def get(self, request):
+        try:
+            versions = [
+                version async for version in
+                Trip.objects.accessible_by(request.user).order_by('id').values_list('id', 'data_version')
+            ]
+            cache_key = (
+                'all_trips', request.user.id, request.user.currency, await ahistory_version(),
+                hashlib.sha1(repr(versions).encode()).hexdigest()
+            )
+
+            response_data = await acached_analytics(cache_key, lambda: aall_trips_analytics(request.user))
+            if response_data is None:
+                return JsonResponse({"error": "No trips found for this user"}, status=404)
+            return JsonResponse(response_data)
+
+        except Exception as e:
+            logger.error(f"All trips analytics error: {str(e)}")
+            return JsonResponse({"error": "Could not generate analytics"}, status=500)
+
+
+class AsyncTripAnalyticsView(AsyncAPIView):
+    #Async TripAnalyticsView
+    async def get(self, request, trip_id):
+        try:
+            trip = await Trip.objects.filter(id=trip_id).afirst()
+            if trip is None:
+                return JsonResponse({"error": "Trip not found"}, status=404)
+
+            if not await ais_trip_member(request.user, trip):
+                return JsonResponse({"error": "Not authorized to view this trip's analytics"}, status=403)
+
+            cache_key = (
+                'trip', trip.id, trip.data_version, request.user.id, request.user.currency, await ahistory_version()
+            )
+            analytics_data = await acached_analytics(cache_key, lambda: atrip_analytics(trip, request.user))
+            return JsonResponse(analytics_data)
+
+        except Exception as e:
+            logger.error(f"Trip analytics error: {str(e)}")
+            return JsonResponse({"error": "Could not generate trip analytics"}, status=500)
+
+
+# BUDGET RECOMMENDATION VIEW
+class AsyncBudgetRecommendationView(AsyncAPIView):
+    #Async BudgetRecommendationView
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as e:
+            return JsonResponse({"detail": f"JSON parse error - {str(e)}"}, status=400)
+
+        try:
+            city = data.get('city')
+            traveler_type = data.get('traveler_type', 'medium')
+            duration = int(data.get('duration', 7))
+
+            if not city:
+                return JsonResponse({"error": "City parameter is required"}, status=400)
+
+            user_currency = getattr(request.user, 'currency', 'GBP')
+            try:
+                recommendation = await arecommend_budget(city, traveler_type, duration, user_currency)
+            except CityNotFound as e:
+                return JsonResponse({"error": str(e)}, status=404)
+
+            return JsonResponse(recommendation)
+
+        except Exception as e:
+            logger.error(f"Budget recommendation error: {str(e)}")
+            return JsonResponse({"error": str(e)}, status=503)
@@ -0,0 +1,215 @@
+"""
+Canonical base-currency amounts of expenses.
+
+Every expense stores its amount converted into settings.EXPENSE_BASE_CURRENCY
+when it is written, together with the rate used and when it was applied. The
+rate is the stored rate of the expense's date (api/rate_history.py) when one
+has been ingested, otherwise today's rate from the rate service. The
+spending rollups sum these amounts, so analytics add up one base-currency
+total per group in SQL and convert it with a single base-to-viewer rate,
+however many currencies the expenses were entered in.
+
+Expenses written while no rate was available keep a null amount_base;
+analytics convert their original amounts instead, and
+`manage.py backfill_expense_base_amounts` fills them in later.
+
+ExpenseConverter shows expenses in a viewer's currency at the rate of each
+expense's date, the same way in the expense list, the exports and the
+analytics: amounts already in the viewer's currency are never converted,
+others are converted from their base amount (or original amount without
+one) at the stored rate of their date, or today's rate if none is stored.
+"""
+
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.utils import timezone
+
+from .exchange_rates import ExchangeRateError, get_rate_service
+from .rate_history import RATE_PLACES, RateHistory
+
+logger = logging.getLogger(__name__)
+
+AMOUNT_PLACES = Decimal('0.0001')
+CENT = Decimal('0.01')
+
+BASE_FIELDS = ['amount_base', 'base_rate', 'base_rate_at']
+
+
+def base_currency():
+    return getattr(settings, 'EXPENSE_BASE_CURRENCY', 'GBP')
+
+
+def base_amount(amount, rate):
+    """`amount` converted with a stored base rate"""
+    return (Decimal(amount) * rate).quantize(AMOUNT_PLACES, rounding=ROUND_HALF_UP)
+
+
+def money(value):
+    """A converted Decimal amount rounded to cents for output"""
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _fields(amount, rate, rated_at):
+    if rate is None:
+        return {'amount_base': None, 'base_rate': None, 'base_rate_at': None}
+    rate = Decimal(str(rate)).quantize(RATE_PLACES)
+    return {'amount_base': base_amount(amount, rate), 'base_rate': rate, 'base_rate_at': rated_at}
+
+
+def base_amount_fields(amount, currency, day):
+    """
+    amount_base, base_rate and base_rate_at for one expense dated `day`.
+    All three are None if no rate is stored or can be fetched, so a rate
+    outage never blocks saving an expense.
+    """
+    base = base_currency()
+    if currency == base:
+        rate = Decimal(1)
+    else:
+        rate = RateHistory.load({currency, base}, day, day).rate(currency, base, day)
+    if rate is None:
+        try:
+            rate = get_rate_service().get_rate(currency, base)
+        except ExchangeRateError as e:
+            logger.warning(f"No base rate for {currency}, amount_base left empty: {str(e)}")
+    return _fields(amount, rate, timezone.now())
+
+
+def fill_base_amounts(expenses):
+    """
+    Set the base amount fields on many expenses: one query for the stored
+    rates of their date range, and one live lookup per currency only for
+    expenses without a stored rate. Returns how many got a base amount.
+    """
+    if not expenses:
+        return 0
+    base = base_currency()
+    currencies = {e.original_currency for e in expenses}
+    history = RateHistory.load(
+        currencies | {base}, min(e.date for e in expenses), max(e.date for e in expenses)
+    )
+    live_rates = None
+    rated_at = timezone.now()
+    filled = 0
+    for expense in expenses:
+        rate = history.rate(expense.original_currency, base, expense.date)
+        if rate is None:
+            if live_rates is None:
+                live_rates = get_rate_service().get_rates(currencies, base)
+            rate = live_rates.get(expense.original_currency)
+        fields = _fields(expense.amount, rate, rated_at)
+        for name, value in fields.items():
+            setattr(expense, name, value)
+        filled += fields['amount_base'] is not None
+    return filled
+
+
+class ExpenseConverter:
+    """
+    Converts amounts into `to_currency` at the rate of their date: the stored
+    rate on or before it, else today's rate from the rate service. A day of
+    None asks for today's rate, e.g. for trip budgets.
+
+    Build it with load() for the currencies and dates to convert, need()
+    every (currency, day) it will convert, then resolve() (or aresolve())
+    fetches the live rates still missing in one step before convert(). To
+    convert a stream batch by batch, load_more() each batch, then need() and
+    resolve() it; rates already looked up or fetched are not asked for again.
+    """
+
+    def __init__(self, to_currency, history):
+        self.to_currency = to_currency
+        self.history = history
+        self.live = {}
+        self._missing = set()
+        self._fetched = set()
+        self._stored = {}
+
+    @staticmethod
+    def _range(currencies, days, to_currency):
+        days = list(days)
+        return set(currencies) | {base_currency(), to_currency}, min(days, default=None), max(days, default=None)
+
+    @classmethod
+    def load(cls, to_currency, currencies, days):
+        """Converter with the stored rates of `currencies` over `days`, read in one query"""
+        currencies, start, end = cls._range(currencies, days, to_currency)
+        return cls(to_currency, RateHistory.load(currencies, start, end) if start else RateHistory([]))
+
+    @classmethod
+    async def aload(cls, to_currency, currencies, days):
+        """Async load"""
+        currencies, start, end = cls._range(currencies, days, to_currency)
+        return cls(to_currency, await RateHistory.aload(currencies, start, end) if start else RateHistory([]))
+
+    def load_more(self, currencies, days):
+        """Swap in the stored rates of the next batch's `currencies` over `days`"""
+        currencies, start, end = self._range(currencies, days, self.to_currency)
+        self.history = RateHistory.load(currencies, start, end) if start else RateHistory([])
+        return self
+
+    @classmethod
+    def for_expenses(cls, expenses, to_currency):
+        """Resolved converter for a list of Expense instances"""
+        converter = cls.load(to_currency, {e.original_currency for e in expenses}, (e.date for e in expenses))
+        for expense in expenses:
+            converter.need(expense.original_currency, expense.date, expense.amount_base is not None)
+        return converter.resolve()
+
+    def _source(self, currency, has_base):
+        # Amounts with a base amount are converted from it
+        if currency == self.to_currency or not has_base:
+            return currency
+        return base_currency()
+
+    def _stored_rate(self, currency, day):
+        if day is None:
+            return None
+        if (currency, day) not in self._stored:
+            self._stored[(currency, day)] = self.history.rate(currency, self.to_currency, day)
+        return self._stored[(currency, day)]
+
+    def need(self, currency, day=None, has_base=False):
+        """Note an amount to convert; its currency needs a live rate if none is stored for `day`"""
+        currency = self._source(currency, has_base)
+        if currency != self.to_currency and currency not in self._fetched and self._stored_rate(currency, day) is None:
+            self._missing.add(currency)
+
+    def resolve(self):
+        """Fetch today's rate of every needed currency without a stored one"""
+        if self._missing:
+            self._add_live(get_rate_service().get_rates(self._missing, self.to_currency))
+        return self
+
+    async def aresolve(self):
+        """Async resolve"""
+        if self._missing:
+            self._add_live(await get_rate_service().aget_rates(self._missing, self.to_currency))
+        return self
+
+    def _add_live(self, rates):
+        self.live.update({currency: Decimal(str(rate)) for currency, rate in rates.items()})
+        self._fetched |= self._missing
+        self._missing.clear()
+
+    def rate(self, currency, day=None):
+        """Decimal rate from `currency` on `day`, or None if none is stored or was fetched"""
+        if currency == self.to_currency:
+            return Decimal(1)
+        stored = self._stored_rate(currency, day)
+        return stored if stored is not None else self.live.get(currency)
+
+    def convert(self, amount, currency, day=None, amount_base=None):
+        """
+        (amount, to_currency), unrounded, or the amount and currency unchanged
+        when they are already in to_currency or no rate is available
+        """
+        if currency == self.to_currency:
+            return amount, currency
+        source = self._source(currency, amount_base is not None)
+        rate = self.rate(source, day)
+        if rate is None:
+            return amount, currency
+        return (amount_base if source != currency else amount) * rate, self.to_currency
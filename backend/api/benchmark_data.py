@@ -0,0 +1,109 @@
+"""
+Synthetic data for benchmarks: N users with M trips each and K expenses per
+trip, in mixed currencies, with tripmates shared between users. Rows are
+bulk inserted and the spending rollups rebuilt once at the end, so large
+data sets are generated in seconds. Deterministic for a given seed.
+"""
+
+import random
+from datetime import date, timedelta
+
+from .base_amounts import fill_base_amounts
+from .budget import recommend_budget, CityNotFound, BudgetUnavailable
+from .exchange_rates import ExchangeRateError
+from .models import CustomUser, Trip, Expense
+from .rollups import rebuild_rollups
+
+# Rates against GBP; tables for the other bases are derived from these
+FAKE_GBP_RATES = {"GBP": 1.0, "USD": 1.27, "EUR": 1.17, "JPY": 190.0, "AUD": 1.93, "CAD": 1.73, "CHF": 1.12}
+
+USER_CURRENCIES = ["GBP", "USD", "EUR", "JPY"]
+DESTINATIONS = ["Paris", "London", "Tokyo", "New York", "Rome", "Barcelona", "Sydney", "Toronto"]
+CATEGORIES = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+EMAIL_DOMAIN = "benchmark.example.com"
+
+
+def fake_rate_tables(gbp_rates=FAKE_GBP_RATES):
+    """{base: {currency: rate}} for every currency in `gbp_rates`"""
+    return {
+        base: {currency: rate / gbp_rates[base] for currency, rate in gbp_rates.items()}
+        for base in gbp_rates
+    }
+
+
+class BenchmarkRateProvider:
+    """Serves fake_rate_tables() in-process, so benchmarks never hit the network."""
+
+    def __init__(self):
+        self.tables = fake_rate_tables()
+        self.fetches = 0
+
+    def fetch(self, base):
+        self.fetches += 1
+        if base not in self.tables:
+            raise ExchangeRateError(f"No rates for {base}")
+        return self.tables[base]
+
+
+def _budget(destination, traveler_type, duration, currency):
+    # A budget that passes trip validation, so write endpoints take the full path
+    try:
+        return recommend_budget(destination, traveler_type, duration, currency)['total_budget']
+    except (CityNotFound, BudgetUnavailable):
+        return 1000
+
+
+def generate(users=10, trips_per_user=10, expenses_per_trip=50, tripmates_per_trip=2, seed=1):
+    """Create the data set; returns the created users, in order."""
+    rng = random.Random(seed)
+    created_users = CustomUser.objects.bulk_create(
+        CustomUser(
+            email=f"user{i}@{EMAIL_DOMAIN}", first_name="Bench", last_name=f"User{i}",
+            currency=USER_CURRENCIES[i % len(USER_CURRENCIES)], password="!",  # unusable password
+        )
+        for i in range(users)
+    )
+
+    budgets = {}
+    trips = []
+    for user in created_users:
+        for t in range(trips_per_user):
+            start = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+            duration = rng.randint(3, 21)
+            destination = rng.choice(DESTINATIONS)
+            traveler_type = rng.choice(list(Trip.TRAVELER_TYPES))[0]
+            key = (destination, traveler_type, duration, user.currency)
+            if key not in budgets:
+                budgets[key] = _budget(*key)
+            trips.append(Trip(
+                user=user, trip_name=f"{destination} {t}", destination=destination,
+                start_date=start, end_date=start + timedelta(days=duration - 1),
+                total_budget=budgets[key], traveler_type=traveler_type, currency=user.currency,
+            ))
+    trips = Trip.objects.bulk_create(trips)
+
+    Through = Trip.tripmate.through
+    members = {}
+    tripmate_rows = []
+    for trip in trips:
+        others = [user for user in created_users if user.id != trip.user_id]
+        mates = rng.sample(others, min(tripmates_per_trip, len(others)))
+        members[trip.id] = [trip.user] + mates
+        tripmate_rows.extend(Through(trip_id=trip.id, customuser_id=mate.id) for mate in mates)
+    Through.objects.bulk_create(tripmate_rows)
+
+    expenses = []
+    for trip in trips:
+        days = (trip.end_date - trip.start_date).days + 1
+        for _ in range(expenses_per_trip):
+            payer = rng.choice(members[trip.id])
+            expenses.append(Expense(
+                trip=trip, amount=rng.randint(100, 20000) / 100,
+                date=trip.start_date + timedelta(days=rng.randrange(days)),
+                category=rng.choice(CATEGORIES), original_currency=payer.currency,
+            ))
+    fill_base_amounts(expenses)
+    Expense.objects.bulk_create(expenses, batch_size=5000)
+
+    rebuild_rollups([trip.id for trip in trips])
+    return created_users
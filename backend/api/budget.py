@@ -0,0 +1,209 @@
+"""
+Budget recommendation engine.
+
+Prices a trip to a city from the cost-of-living indices, the traveler type
+multiplier table and the trip duration. Used in-process by
+BudgetRecommendationView and by trip create/update budget validation, so
+validation no longer makes an HTTP call back into this server.
+"""
+
+import logging
+
+from .cost_data import get_cost_table, CostDataUnavailable
+from .exchange_rates import get_rate_service, ExchangeRateError
+
+logger = logging.getLogger(__name__)
+
+# Traveler type multipliers applied to every daily cost category
+TRAVELER_MULTIPLIERS = {
+    "luxury": 1.8,
+    "medium": 1.0,
+    "budget": 0.6
+}
+
+# Budgets must be within this fraction of the recommended budget
+BUDGET_TOLERANCE = 0.5
+
+# Trip fields budget validation depends on
+BUDGET_FIELDS = {'total_budget', 'destination', 'traveler_type', 'start_date', 'end_date'}
+
+# Most items priced by one batch request
+MAX_BATCH_ITEMS = 500
+
+CONVERSION_UNAVAILABLE = "Currency conversion service unavailable. Using original values."
+
+
+class CityNotFound(Exception):
+    """No cost of living data matches the requested city."""
+
+
+class BudgetUnavailable(Exception):
+    """The recommendation could not be converted to the requested currency."""
+
+
+def get_city_cost_data(city):
+    """Cost of living data for the best matching city, or None"""
+    table = get_cost_table()
+    city_name = table.city_index.lookup(city)
+    return table.row(city_name) if city_name else None
+
+
+def search_cities(query, limit=10):
+    """Ranked city matches for autocomplete, with each city's currency"""
+    table = get_cost_table()
+    return [
+        {'city': name, 'currency': table.currencies[table.row_of[name]]}
+        for name in table.city_index.search(query, limit)
+    ]
+
+
+def daily_costs(cost_data, traveler_type):
+    """Daily cost per category in the city's own currency"""
+    multiplier = TRAVELER_MULTIPLIERS.get(traveler_type, 1.0)
+    return {
+        'food and dining': (cost_data['groceries_index'] + cost_data['restaurant_index']) / 2 * multiplier,  # Average of both
+        'accommodation': cost_data['rent_index'] * multiplier,
+        'general': cost_data['index'] * multiplier,
+        'entertainment': cost_data['purchasing_index'] * multiplier,
+    }
+
+
+def recommend_budget(city, traveler_type='medium', duration=7, currency='GBP'):
+    """
+    Recommended budget for `duration` days in `city`, in `currency`.
+    Returns the BudgetRecommendationView response body; raises CityNotFound
+    or BudgetUnavailable.
+    """
+    cost_data = get_city_cost_data(city)
+    if not cost_data:
+        raise CityNotFound(f"Cost data not available for {city}. Please try a major city.")
+
+    costs = daily_costs(cost_data, traveler_type)
+
+    # Convert to the requested currency if needed
+    source_currency = cost_data['currency_type']
+    rate = None
+    if source_currency != currency:
+        try:
+            rate = get_rate_service().get_rate(source_currency, currency)
+        except ExchangeRateError as e:
+            logger.error(f"Currency conversion failed: {str(e)}")
+            raise BudgetUnavailable(CONVERSION_UNAVAILABLE)
+
+    return _recommendation(city, traveler_type, duration, costs, source_currency, currency, rate)
+
+
+async def arecommend_budget(city, traveler_type='medium', duration=7, currency='GBP'):
+    """Async recommend_budget; the cost table is an in-memory lookup once loaded"""
+    cost_data = get_city_cost_data(city)
+    if not cost_data:
+        raise CityNotFound(f"Cost data not available for {city}. Please try a major city.")
+
+    costs = daily_costs(cost_data, traveler_type)
+    source_currency = cost_data['currency_type']
+    rate = None
+    if source_currency != currency:
+        try:
+            rate = await get_rate_service().aget_rate(source_currency, currency)
+        except ExchangeRateError as e:
+            logger.error(f"Currency conversion failed: {str(e)}")
+            raise BudgetUnavailable(CONVERSION_UNAVAILABLE)
+
+    return _recommendation(city, traveler_type, duration, costs, source_currency, currency, rate)
+
+
+def _recommendation(city, traveler_type, duration, costs, source_currency, currency, rate):
+    # Shared by the single and batch paths so both round identically
+    if rate is not None:
+        costs = {k: round(v * rate, 2) for k, v in costs.items()}
+
+    # Calculate totals
+    daily_total = sum(costs.values())  # Sum ALL categories
+    return {
+        'city': city,
+        'daily_breakdown': {k: round(v, 2) for k, v in costs.items()},
+        'daily_total': round(daily_total, 2),
+        'total_budget': round(daily_total * duration, 2),
+        'currency': currency,
+        'traveler_type': traveler_type,
+        'duration_days': duration,
+        'source_currency': source_currency,
+        'is_converted': currency != source_currency
+    }
+
+
+def batch_daily_costs(table, rows, traveler_types):
+    """
+    Daily costs for many (row, traveler type) pairs at once. Each category is
+    computed by one pass over the table's index columns, so a city's indices
+    are never copied into a per-request dict.
+    """
+    columns = table.columns
+    multipliers = [TRAVELER_MULTIPLIERS.get(t, 1.0) for t in traveler_types]
+    food = [(columns['groceries_index'][r] + columns['restaurant_index'][r]) / 2 * m for r, m in zip(rows, multipliers)]
+    accommodation = [columns['rent_index'][r] * m for r, m in zip(rows, multipliers)]
+    general = [columns['index'][r] * m for r, m in zip(rows, multipliers)]
+    entertainment = [columns['purchasing_index'][r] * m for r, m in zip(rows, multipliers)]
+    return [
+        {'food and dining': f, 'accommodation': a, 'general': g, 'entertainment': e}
+        for f, a, g, e in zip(food, accommodation, general, entertainment)
+    ]
+
+
+def recommend_budgets(items, currency='GBP'):
+    """
+    Price many (city, traveler_type, duration) items in one pass. Each city
+    is matched once and each source currency converted once. Returns one
+    entry per item, in order: the recommend_budget body, or {'city', 'error'}.
+    """
+    table = get_cost_table()
+    names = {}
+    for item in items:
+        if item['city'] not in names:
+            names[item['city']] = table.city_index.lookup(item['city'])
+
+    priced = [i for i, item in enumerate(items) if names[item['city']]]
+    rows = [table.row_of[names[items[i]['city']]] for i in priced]
+    costs = batch_daily_costs(table, rows, [items[i]['traveler_type'] for i in priced])
+
+    sources = {table.currencies[row] for row in rows}
+    rates = get_rate_service().get_rates(sources - {currency}, currency)
+
+    results = [
+        {'city': item['city'], 'error': f"Cost data not available for {item['city']}. Please try a major city."}
+        for item in items
+    ]
+    for i, row, item_costs in zip(priced, rows, costs):
+        item = items[i]
+        source_currency = table.currencies[row]
+        if source_currency != currency and source_currency not in rates:
+            results[i] = {'city': item['city'], 'error': CONVERSION_UNAVAILABLE}
+            continue
+        results[i] = _recommendation(
+            item['city'], item['traveler_type'], item['duration'], item_costs,
+            source_currency, currency, rates.get(source_currency)
+        )
+    return results
+
+
+def budget_validation_error(requested_budget, city, traveler_type, duration, currency):
+    """
+    Error message if `requested_budget` is outside the allowed range around
+    the recommendation, otherwise None. Validation is skipped (None) when no
+    recommendation can be made, as before, including when the cost data is
+    missing.
+    """
+    try:
+        recommended = recommend_budget(city, traveler_type, duration, currency)
+    except (CityNotFound, BudgetUnavailable, CostDataUnavailable) as e:
+        logger.error(f"Budget validation error: {str(e)}")
+        return None
+
+    min_allowed = recommended['total_budget'] * (1 - BUDGET_TOLERANCE)
+    max_allowed = recommended['total_budget'] * (1 + BUDGET_TOLERANCE)
+    if min_allowed <= float(requested_budget) <= max_allowed:
+        return None
+    return (
+        f"Budget must be within {BUDGET_TOLERANCE:.0%} of recommended {traveler_type} budget "
+        f"({recommended['total_budget']:.2f} {recommended['currency']})"
+    )
@@ -0,0 +1,120 @@
+"""
+Normalized search index over the cost-of-living city names.
+
+Built on the first city lookup, not when the cost data loads. Names are
+folded to lowercase ASCII (accents stripped); exact names resolve through a
+dict and prefixes by bisecting the sorted names, which covers lookups such
+as "Paris" for "Paris, France". Substring searches intersect n-gram postings
+instead of scanning every city; those are built on the first search that
+needs them. Results are ranked and deterministic.
+"""
+
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+# Substring lookups use n-grams up to this length; shorter queries are
+# answered straight from their own postings list.
+NGRAM_SIZE = 3
+
+
+def normalize(text):
+    """Lowercase, accent-free, single-spaced form used for matching"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+
+def _ngrams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class CityIndex:
+    """Exact, prefix and substring search over a fixed list of city names"""
+
+    def __init__(self, names):
+        self.names = sorted(names)
+        self._normalized = [normalize(name) for name in self.names]
+        self._exact = {}
+        for row, norm in enumerate(self._normalized):
+            self._exact.setdefault(norm, row)
+        # Rows ordered by normalized name, for prefix lookups
+        self._prefix_rows = sorted(range(len(self.names)), key=lambda row: self._normalized[row])
+        self._prefix_keys = [self._normalized[row] for row in self._prefix_rows]
+        self._postings = None
+        self._lock = threading.Lock()
+
+    def _build_postings(self):
+        postings = defaultdict(list)
+        for row, norm in enumerate(self._normalized):
+            for size in range(1, NGRAM_SIZE + 1):
+                for gram in _ngrams(norm, size):
+                    postings[gram].append(row)
+        # Rows are appended in order, so each postings list is already sorted;
+        # packed arrays keep the index a fraction of the size of sets
+        return {gram: array('I', rows) for gram, rows in postings.items()}
+
+    def _get_postings(self):
+        if self._postings is None:
+            with self._lock:
+                if self._postings is None:
+                    self._postings = self._build_postings()
+        return self._postings
+
+    def _candidates(self, query):
+        postings = self._get_postings()
+        if len(query) <= NGRAM_SIZE:
+            return postings.get(query, ())
+        grams = sorted(_ngrams(query, NGRAM_SIZE), key=lambda gram: len(postings.get(gram, ())))
+        rows = set(postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not rows:
+                break
+            rows.intersection_update(postings.get(gram, ()))
+        # n-grams can all match without the query being contiguous; confirm
+        return {row for row in rows if query in self._normalized[row]}
+
+    def _rank(self, row, query):
+        norm = self._normalized[row]
+        position = norm.find(query)
+        if norm == query:
+            kind = 0  # exact
+        elif position == 0:
+            kind = 1  # prefix of the full name
+        elif norm[position - 1] in ' ,-':
+            kind = 2  # start of a word, e.g. "york" in "new york"
+        else:
+            kind = 3  # anywhere else
+        return (kind, position, len(norm), self.names[row])
+
+    def search(self, query, limit=10):
+        """City names matching `query`, best first"""
+        query = normalize(query)
+        if not query:
+            return []
+        rows = self._candidates(query)
+        ranked = sorted(rows, key=lambda row: self._rank(row, query))
+        return [self.names[row] for row in ranked[:limit]]
+
+    def _prefix_matches(self, query):
+        start = bisect_left(self._prefix_keys, query)
+        end = start
+        while end < len(self._prefix_keys) and self._prefix_keys[end].startswith(query):
+            end += 1
+        return self._prefix_rows[start:end]
+
+    def lookup(self, city):
+        """Exact name in O(1), else the best prefix, else the best substring match, else None"""
+        query = normalize(city)
+        if not query:
+            return None
+        if query in self._exact:
+            return self.names[self._exact[query]]
+        # Prefix matches outrank every other non-exact match, as in search()
+        rows = self._prefix_matches(query)
+        if rows:
+            return self.names[min(rows, key=lambda row: self._rank(row, query))]
+        matches = self.search(query, limit=1)
+        return matches[0] if matches else None
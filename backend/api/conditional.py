@@ -0,0 +1,88 @@
+"""
+ETag / Last-Modified support for the trip, expense and analytics endpoints.
+
+Tags are computed from one aggregate over the trips the user can access
+(count, id and data_version sums) plus the viewing
+currency, the fetch time of the held exchange rate tables and the latest
+ingest of stored rates, since amounts are converted on the way out. Every write to a trip, its expenses or its
+tripmates bumps the trip's data_version and updated_at, so expense lists are
+covered by the same aggregate. Django's `condition` decorator answers 304
+before the view serializes or aggregates anything.
+
+Set-valued endpoints (trip and expense lists, all-trips analytics) send only
+an ETag: a trip deleted or unshared leaves the set without moving any
+remaining trip's updated_at, so a Last-Modified from them would go stale.
+Single-trip endpoints send both.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+
+from django.db.models import Count, Sum
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .exchange_rates import get_rate_service
+from .membership import is_trip_member
+from .models import Trip
+from .rate_history import history_version
+
+# Attribute memoizing the computed state on the request, since the ETag and
+# Last-Modified functions are called separately
+STATE_ATTR = '_conditional_state'
+
+
+def _state(request, parts, last_modified):
+    # Tag and timestamp for one request, folding in currency and rates
+    fetched_at = get_rate_service().tables_fetched_at()
+    if fetched_at is not None:
+        rates_modified = datetime.fromtimestamp(fetched_at, tz=timezone.utc)
+        last_modified = max(last_modified, rates_modified) if last_modified else rates_modified
+    ingested_at = history_version()
+    if ingested_at is not None:
+        last_modified = max(last_modified, ingested_at) if last_modified else ingested_at
+
+    parts = parts + (
+        request.path, request.GET.urlencode(), request.user.id, request.user.currency, fetched_at, ingested_at,
+    )
+    etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return etag, last_modified
+
+
+def _accessible_trips_state(request):
+    state = getattr(request, STATE_ATTR, None)
+    if state is None:
+        summary = Trip.objects.accessible_by(request.user).aggregate(
+            count=Count('id'), ids=Sum('id'), versions=Sum('data_version'),
+        )
+        state = _state(request, ('trips', summary['count'], summary['ids'], summary['versions']), None)
+        setattr(request, STATE_ATTR, state)
+    return state
+
+
+def _trip_state(request, trip_id):
+    # None for missing or forbidden trips, so the view answers 404/403 itself
+    state = getattr(request, STATE_ATTR, None)
+    if state is None:
+        trip = Trip.objects.filter(id=trip_id).only('id', 'user_id', 'data_version', 'updated_at').first()
+        if trip is None or not is_trip_member(request.user, trip):
+            state = (None, None)
+        else:
+            state = _state(request, ('trip', trip.id, trip.data_version), trip.updated_at)
+        setattr(request, STATE_ATTR, state)
+    return state
+
+
+def accessible_trips_conditional(name='get'):
+    """Class decorator making `name` answer conditional GETs from the user's trips, by ETag only"""
+    return method_decorator(condition(
+        etag_func=lambda request, *args, **kwargs: _accessible_trips_state(request)[0],
+    ), name=name)
+
+
+def trip_conditional(name='get'):
+    """Class decorator making `name` answer conditional GETs from the trip in the URL"""
+    return method_decorator(condition(
+        etag_func=lambda request, trip_id, *args, **kwargs: _trip_state(request, trip_id)[0],
+        last_modified_func=lambda request, trip_id, *args, **kwargs: _trip_state(request, trip_id)[1],
+    ), name=name)
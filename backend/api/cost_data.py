@@ -0,0 +1,171 @@
+"""
+Lazily loaded cost-of-living table.
+
+Nothing is read at import time. The first lookup loads the indices into one
+float array per index column plus a name -> row map, either from the JSON
+source or from a precompiled binary snapshot (see the compile_cost_data
+command). The city search index is only built when a city is first looked
+up. The source file's mtime is re-checked periodically and the table is
+reloaded when it changes.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from .city_index import CityIndex
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMNS = ('index', 'rent_index', 'groceries_index', 'restaurant_index', 'purchasing_index')
+SNAPSHOT_VERSION = 1
+
+# Seconds between mtime checks of the source file
+RELOAD_CHECK_INTERVAL = 5
+
+
+class CostDataUnavailable(Exception):
+    """Neither the JSON source nor a snapshot could be loaded."""
+
+
+class CostTable:
+    """Column-oriented cost-of-living indices for every city"""
+
+    def __init__(self, names, currencies, columns, source_mtime=None):
+        self.names = names
+        self.currencies = currencies
+        self.columns = columns  # column name -> array('d'), one value per row
+        self.row_of = {name: row for row, name in enumerate(names)}
+        self.source_mtime = source_mtime
+        self._city_index = None
+
+    @property
+    def city_index(self):
+        """Search index over the city names, built on first use"""
+        if self._city_index is None:
+            self._city_index = CityIndex(self.names)
+        return self._city_index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.row_of
+
+    def row(self, name):
+        """The city's indices as a dict, in the shape of the JSON source"""
+        row = self.row_of[name]
+        data = {column: values[row] for column, values in self.columns.items()}
+        data['currency_type'] = self.currencies[row]
+        return data
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, 'r') as f:
+            raw = json.load(f)
+        names = list(raw)
+        columns = {column: array('d', (float(raw[name][column]) for name in names)) for column in INDEX_COLUMNS}
+        currencies = [raw[name]['currency_type'] for name in names]
+        return cls(names, currencies, columns, os.path.getmtime(path))
+
+    def write_snapshot(self, path):
+        """One JSON header line followed by the raw float64 columns"""
+        header = {
+            'version': SNAPSHOT_VERSION,
+            'source_mtime': self.source_mtime,
+            'names': self.names,
+            'currencies': self.currencies,
+            'columns': list(self.columns),
+        }
+        with open(path, 'wb') as f:
+            f.write(json.dumps(header).encode() + b'\n')
+            for values in self.columns.values():
+                f.write(values.tobytes())
+
+    @classmethod
+    def from_snapshot(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {header.get('version')}")
+            count = len(header['names'])
+            columns = {}
+            for column in header['columns']:
+                values = array('d')
+                values.frombytes(f.read(count * values.itemsize))
+                columns[column] = values
+        return cls(header['names'], header['currencies'], columns, header['source_mtime'])
+
+
+def source_path():
+    return getattr(settings, 'COST_OF_LIVING_FILE', None) or os.path.join(
+        settings.BASE_DIR, '../frontend/src/data/cost_of_living_indices.json'
+    )
+
+
+def snapshot_path():
+    return getattr(settings, 'COST_OF_LIVING_SNAPSHOT', None)
+
+
+def _source_mtime():
+    try:
+        return os.path.getmtime(source_path())
+    except OSError:
+        return None
+
+
+def load_table():
+    """
+    Load from the snapshot when it matches the source (or the source is
+    missing), otherwise from the JSON source.
+    """
+    source_mtime = _source_mtime()
+    snapshot = snapshot_path()
+    if snapshot and os.path.exists(snapshot):
+        try:
+            table = CostTable.from_snapshot(snapshot)
+            if source_mtime is None or table.source_mtime == source_mtime:
+                return table
+        except (OSError, ValueError) as e:
+            logger.error(f"Cost data snapshot unusable: {str(e)}")
+
+    if source_mtime is None:
+        raise CostDataUnavailable(f"Cost of living data not found at {source_path()}")
+    return CostTable.from_json(source_path())
+
+
+_table = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_cost_table():
+    """The loaded table, reloaded if the source file changed since loading"""
+    global _table, _checked_at
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _table
+
+    with _lock:
+        if _table is None:
+            _table = load_table()
+        elif now - _checked_at >= RELOAD_CHECK_INTERVAL:
+            mtime = _source_mtime()
+            if mtime is not None and mtime != _table.source_mtime:
+                logger.info("Cost of living data changed on disk, reloading")
+                _table = load_table()
+        _checked_at = now
+        return _table
+
+
+def reset_cost_table():
+    """Forget the loaded table so the next lookup loads it again"""
+    global _table, _checked_at
+    with _lock:
+        _table = None
+        _checked_at = 0.0
@@ -0,0 +1,510 @@
+"""
+Exchange rate service shared by the serializers and views.
+
+The rate API returns every rate for a base currency in one response, so whole
+tables are cached per base currency instead of one cache entry per currency
+pair. Cross rates are derived from tables that are already held, and the
+provider that fetches tables can be swapped (HTTP API, local JSON file,
+fixture) through settings.
+
+The a-prefixed methods are the asyncio versions used by the async views:
+a fetch runs off the event loop, and concurrent requests for the same base
+currency share one in-flight fetch (single-flight).
+
+Provider failures are remembered instead of being paid for on every lookup:
+a circuit breaker stops calling a provider that is down (connection errors,
+timeouts, 5xx) for a cooldown, a failed
+base currency is not retried for a short negative-cache TTL, and meanwhile
+the last table successfully fetched for it (kept much longer than the TTL)
+is served instead. Code converting with such a stale table can tell from
+track_rate_usage(), and responses carry an X-Rates-Stale header.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .instrumentation import timed, record_rate_lookup, record_stale_rates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.exchangerate-api.com/v4/latest/{base}"
+DEFAULT_TTL = 3600
+DEFAULT_NEGATIVE_TTL = 60
+DEFAULT_STALE_TTL = 7 * 24 * 3600
+
+
+class ExchangeRateError(Exception):
+    """Raised when a rate cannot be fetched or derived."""
+
+
+class ProviderUnavailable(ExchangeRateError):
+    """
+    The provider could not be reached or failed (connection error, timeout,
+    5xx). Only these trip the circuit breaker; a base currency the provider
+    does not quote is an ordinary ExchangeRateError.
+    """
+
+
+# PROVIDERS
+class HTTPRateProvider:
+    """Fetches a full rate table for a base currency from the rate API."""
+
+    def __init__(self, url=None, timeout=None):
+        self.url = url or getattr(settings, 'EXCHANGE_RATE_API_URL', DEFAULT_API_URL)
+        self.timeout = timeout or getattr(settings, 'EXCHANGE_RATE_TIMEOUT', 5)
+
+    def fetch(self, base):
+        try:
+            response = requests.get(self.url.format(base=base), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ProviderUnavailable(f"Could not fetch rates for {base}: {e}") from e
+        if response.status_code >= 500:
+            raise ProviderUnavailable(f"Could not fetch rates for {base}: HTTP {response.status_code}")
+        try:
+            response.raise_for_status()
+            return response.json()['rates']
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            raise ExchangeRateError(f"Could not fetch rates for {base}: {e}") from e
+
+
+class FileRateProvider:
+    """
+    Reads rate tables from a local JSON file, e.g. for tests or offline use.
+    The file maps base currencies to rate tables:
+    {"GBP": {"USD": 1.27, "EUR": 1.17}, "USD": {...}}
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.EXCHANGE_RATE_FILE
+
+    def fetch(self, base):
+        try:
+            with open(self.path, 'r') as f:
+                tables = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ExchangeRateError(f"Could not read rate file {self.path}: {e}") from e
+        if base not in tables:
+            raise ExchangeRateError(f"No rates for {base} in {self.path}")
+        return tables[base]
+
+
+class StaticRateProvider:
+    """Serves rate tables from an in-memory dict (fixtures)."""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def fetch(self, base):
+        if base not in self.tables:
+            raise ExchangeRateError(f"No rates for {base}")
+        return self.tables[base]
+
+
+# CIRCUIT BREAKER
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive provider failures and rejects calls
+    for `cooldown` seconds. Then one trial call is let through (half-open):
+    success closes the circuit, failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return 'open'
+            return 'half-open'
+
+    def allow(self):
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+# SERVICE
+class ExchangeRateService:
+    """
+    Caches whole rate tables per base currency for `ttl` seconds and answers
+    pair lookups from them, fetching at most one table per base currency.
+    Failed fetches fall back to the last good table for up to `stale_ttl`
+    seconds and are not retried for `negative_ttl` seconds.
+    """
+
+    def __init__(self, provider, ttl=DEFAULT_TTL, breaker=None,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, stale_ttl=DEFAULT_STALE_TTL):
+        self.provider = provider
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker()
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        # Base currencies whose tables this process has cached; used to find
+        # a pivot table for cross rates without fetching.
+        self._known_bases = set()
+        self._lock = threading.Lock()
+        # (event loop, base) -> task fetching that table, for single-flight
+        self._inflight = {}
+
+    @staticmethod
+    def _cache_key(base):
+        return f"exchange_rates_{base}"
+
+    @staticmethod
+    def _stale_key(base):
+        # Last good table, kept for stale_ttl after it expires from _cache_key
+        return f"exchange_rates_last_{base}"
+
+    @staticmethod
+    def _failure_key(base):
+        return f"exchange_rates_failed_{base}"
+
+    def _use_entry(self, entry):
+        # Cache entries are {'rates': {...}, 'fetched_at': epoch seconds},
+        # plus 'stale': True when served after a failed fetch
+        if entry.get('stale'):
+            record_stale_rates(entry['base'])
+        _record_usage(entry['fetched_at'] + self.ttl, entry.get('stale', False))
+        return entry['rates']
+
+    def get_cached_table(self, base):
+        """Return the cached table for `base` or None, never fetching."""
+        entry = cache.get(self._cache_key(base))
+        if entry is None:
+            return None
+        return self._use_entry(entry)
+
+    def get_table(self, base):
+        """Return the full rate table for `base`, fetching it if needed."""
+        table = self.get_cached_table(base)
+        if table is not None:
+            return table
+        return self._use_entry(self._fetch_entry(base))
+
+    def refresh_table(self, base):
+        """
+        Fetch `base`'s table now, replacing the cached one even if it has not
+        expired (cache warming). Returns the entry, marked 'stale' if the
+        fetch failed and the last good table was used instead.
+        """
+        return self._fetch_entry(base)
+
+    def _fetch_entry(self, base):
+        failure = cache.get(self._failure_key(base))
+        if failure is None and self.breaker.allow():
+            try:
+                with timed('rate-fetch'):
+                    table = self.provider.fetch(base)
+                entry = self._make_entry(base, table)
+            except ExchangeRateError as e:
+                failure = self._record_failure(base, e)
+                cache.set(self._failure_key(base), failure, timeout=self.negative_ttl)
+            except Exception:
+                # Any other error still ends a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                cache.set(self._cache_key(base), entry, timeout=self.ttl)
+                cache.set(self._stale_key(base), entry, timeout=self.stale_ttl)
+                return entry
+        return self._stale_entry(base, cache.get_many(self._stale_keys(base)), failure)
+
+    def _record_failure(self, base, error):
+        if isinstance(error, ProviderUnavailable):
+            self.breaker.record_failure()
+        else:
+            # The provider answered (e.g. it does not quote `base`), so it is
+            # up: the failure is only negatively cached for this base
+            self.breaker.record_success()
+        logger.warning(f"Rate fetch for {base} failed, circuit {self.breaker.state}: {str(error)}")
+        return str(error)
+
+    def _stale_keys(self, base):
+        # Last good tables of `base` and of every base usable as a pivot
+        with self._lock:
+            bases = [base, *sorted(self._known_bases - {base})]
+        return [self._stale_key(b) for b in bases]
+
+    def _stale_entry(self, base, held, failure):
+        # Fallback after a failed, negatively cached or short-circuited fetch:
+        # the last good table for `base`, else one derived from another base's
+        entry = held.get(self._stale_key(base))
+        if entry is None:
+            for pivot in held.values():
+                if pivot['rates'].get(base):
+                    rate = pivot['rates'][base]
+                    entry = {
+                        'base': base, 'fetched_at': pivot['fetched_at'],
+                        'rates': {currency: value / rate for currency, value in pivot['rates'].items()},
+                    }
+                    break
+        if entry is None:
+            reason = failure or "rate provider circuit open"
+            raise ExchangeRateError(f"Rates for {base} unavailable ({reason}) and no earlier table held")
+        return {**entry, 'stale': True}
+
+    def _make_entry(self, base, table):
+        table = {currency: float(rate) for currency, rate in table.items()}
+        table[base] = 1.0
+        with self._lock:
+            self._known_bases.add(base)
+        return {'base': base, 'rates': table, 'fetched_at': time.time()}
+
+    async def _afetch_entry(self, base):
+        # Providers may offer a native `afetch`; otherwise the blocking fetch
+        # runs in a worker thread so a slow provider never stalls the loop
+        failure = await cache.aget(self._failure_key(base))
+        if failure is None and self.breaker.allow():
+            afetch = getattr(self.provider, 'afetch', None)
+            try:
+                with timed('rate-fetch'):
+                    if afetch is not None:
+                        table = await afetch(base)
+                    else:
+                        table = await asyncio.to_thread(self.provider.fetch, base)
+                entry = self._make_entry(base, table)
+            except ExchangeRateError as e:
+                failure = self._record_failure(base, e)
+                await cache.aset(self._failure_key(base), failure, timeout=self.negative_ttl)
+            except (Exception, asyncio.CancelledError):
+                # Any other error or a cancelled fetch still ends a half-open trial
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                await cache.aset(self._cache_key(base), entry, timeout=self.ttl)
+                await cache.aset(self._stale_key(base), entry, timeout=self.stale_ttl)
+                return entry
+        return self._stale_entry(base, await cache.aget_many(self._stale_keys(base)), failure)
+
+    async def aget_table(self, base):
+        """Async get_table; concurrent callers for one base share one fetch."""
+        entry = await cache.aget(self._cache_key(base))
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            key = (loop, base)
+            task = self._inflight.get(key)
+            if task is None:
+                task = loop.create_task(self._afetch_entry(base))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # A cancelled caller must not cancel the fetch others wait on
+            entry = await asyncio.shield(task)
+        return self._use_entry(entry)
+
+    def tables_fetched_at(self):
+        """
+        Latest fetch time (epoch seconds) of the rate tables this process
+        holds, or None. Changes whenever any table is refreshed, so it can
+        stand in for "the rates" in ETags of converted responses.
+        """
+        with self._lock:
+            bases = list(self._known_bases)
+        held = cache.get_many([self._cache_key(base) for base in bases])
+        return max((entry['fetched_at'] for entry in held.values()), default=None)
+
+    def _derive_rate(self, from_currency, to_currency):
+        # Use any table already held before going to the provider
+        table = self.get_cached_table(from_currency)
+        if table is not None and to_currency in table:
+            return table[to_currency]
+
+        table = self.get_cached_table(to_currency)
+        if table is not None and table.get(from_currency):
+            return 1 / table[from_currency]
+
+        with self._lock:
+            pivots = list(self._known_bases - {from_currency, to_currency})
+        if pivots:
+            held = cache.get_many([self._cache_key(base) for base in pivots])
+            for entry in held.values():
+                table = entry['rates']
+                if table.get(from_currency) and to_currency in table:
+                    self._use_entry(entry)
+                    return table[to_currency] / table[from_currency]
+        return None
+
+    def get_rate(self, from_currency, to_currency):
+        """Rate to multiply an amount in `from_currency` by to get `to_currency`."""
+        if from_currency == to_currency:
+            return 1.0
+
+        with timed('rates'):
+            rate = self._derive_rate(from_currency, to_currency)
+            record_rate_lookup(hit=rate is not None)
+            if rate is not None:
+                return rate
+
+            table = self.get_table(from_currency)
+        if to_currency not in table:
+            raise ExchangeRateError(f"No exchange rate available for {to_currency}")
+        return table[to_currency]
+
+    async def aget_rate(self, from_currency, to_currency):
+        """Async get_rate."""
+        if from_currency == to_currency:
+            return 1.0
+
+        with timed('rates'):
+            # Derivation only reads the cache
+            rate = await sync_to_async(self._derive_rate)(from_currency, to_currency)
+            record_rate_lookup(hit=rate is not None)
+            if rate is not None:
+                return rate
+
+            table = await self.aget_table(from_currency)
+        if to_currency not in table:
+            raise ExchangeRateError(f"No exchange rate available for {to_currency}")
+        return table[to_currency]
+
+    def get_rates(self, from_currencies, to_currency):
+        """
+        Resolve the rate of every currency in `from_currencies` into
+        `to_currency` in one step. Currencies without a rate are left out,
+        so each failure is paid once rather than once per converted row.
+        """
+        rates = {}
+        with timed('rates'):
+            for from_currency in set(from_currencies):
+                try:
+                    rates[from_currency] = self.get_rate(from_currency, to_currency)
+                except ExchangeRateError as e:
+                    logger.error(f"Currency conversion failed: {str(e)}")
+        return rates
+
+    async def aget_rates(self, from_currencies, to_currency):
+        """Async get_rates; the missing tables are fetched concurrently."""
+        from_currencies = list(set(from_currencies))
+        with timed('rates'):
+            results = await asyncio.gather(
+                *(self.aget_rate(currency, to_currency) for currency in from_currencies),
+                return_exceptions=True,
+            )
+        rates = {}
+        for from_currency, result in zip(from_currencies, results):
+            if isinstance(result, ExchangeRateError):
+                logger.error(f"Currency conversion failed: {str(result)}")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                rates[from_currency] = result
+        return rates
+
+    def convert(self, amount, from_currency, to_currency):
+        """Convert `amount` and round to 2 decimal places."""
+        if from_currency == to_currency:
+            return amount
+        return apply_rate(amount, self.get_rate(from_currency, to_currency))
+
+
+# RATE USAGE TRACKING
+# A context variable rather than a thread-local so that concurrent async
+# requests on one event loop thread do not record into each other's usage
+_active_usage = ContextVar('rate_usage', default=())
+
+
+class RateUsage:
+    """
+    Earliest expiry of the rate tables read while tracking was active, and
+    whether any of them was a stale fallback table
+    """
+
+    def __init__(self):
+        self.expires_at = None
+        self.stale = False
+
+    def record(self, expires_at, stale=False):
+        if self.expires_at is None or expires_at < self.expires_at:
+            self.expires_at = expires_at
+        self.stale = self.stale or stale
+
+
+def _record_usage(expires_at, stale=False):
+    for usage in _active_usage.get():
+        usage.record(expires_at, stale)
+
+
+@contextmanager
+def track_rate_usage():
+    """
+    Record which rate tables a block of code converts with, so results built
+    from them (e.g. cached responses) can expire together with the rates.
+    """
+    usage = RateUsage()
+    token = _active_usage.set(_active_usage.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _active_usage.reset(token)
+
+
+def apply_rate(amount, rate):
+    """Convert `amount` with a known rate, rounded the same way as convert()."""
+    return round(float(amount) * rate, 2)
+
+
+_service = None
+
+
+def get_rate_service():
+    """Return the process-wide service built from settings."""
+    global _service
+    if _service is None:
+        provider_class = import_string(
+            getattr(settings, 'EXCHANGE_RATE_PROVIDER', 'api.exchange_rates.HTTPRateProvider')
+        )
+        _service = ExchangeRateService(
+            provider_class(),
+            ttl=getattr(settings, 'EXCHANGE_RATE_TTL', DEFAULT_TTL),
+            breaker=CircuitBreaker(
+                threshold=getattr(settings, 'EXCHANGE_RATE_FAILURE_THRESHOLD', 5),
+                cooldown=getattr(settings, 'EXCHANGE_RATE_COOLDOWN', 30),
+            ),
+            negative_ttl=getattr(settings, 'EXCHANGE_RATE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL),
+            stale_ttl=getattr(settings, 'EXCHANGE_RATE_STALE_TTL', DEFAULT_STALE_TTL),
+        )
+    return _service
+
+
+def set_rate_service(service):
+    """Replace the process-wide service, e.g. with a fixture-backed one."""
+    global _service
+    _service = service
@@ -0,0 +1,149 @@
+"""
+Streaming CSV/NDJSON export of trips and expenses.
+
+Rows are read with QuerySet.iterator(chunk_size=...) and written to a
+StreamingHttpResponse as they are produced, so memory stays flat and the
+first bytes go out before the query has finished. Amounts are converted to
+the viewer's currency: expenses at the rate of their date, like the expense
+list and analytics (ExpenseConverter in api/base_amounts.py), with rates
+resolved per chunk as it streams; trip budgets at today's rate, resolved
+before streaming starts. Rate lookups made while streaming come after the
+headers, so they are not reported in Server-Timing or X-Rates-Stale.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .base_amounts import ExpenseConverter, money
+from .rate_history import RateHistory
+from .exchange_rates import get_rate_service, apply_rate
+
+EXPENSE_FIELDS = [
+    "id", "trip", "trip_name", "date", "category", "description",
+    "amount", "currency", "original_amount", "original_currency",
+]
+TRIP_FIELDS = [
+    "id", "trip_name", "destination", "start_date", "end_date", "traveler_type",
+    "total_budget", "currency", "original_total_budget", "original_currency", "savings",
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _convert(amount, currency, rates, viewer_currency):
+    # Falls back to the original amount and currency when no rate is available
+    if currency == viewer_currency or currency not in rates:
+        return str(amount), currency
+    return f"{apply_rate(amount, rates[currency]):.2f}", viewer_currency
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _expense_row(row, converter):
+    amount, currency = converter.convert(row['amount'], row['original_currency'], row['date'], row['amount_base'])
+    # Falls back to the original amount and currency when no rate is available
+    amount = str(money(amount)) if currency != row['original_currency'] else str(row['amount'])
+    return {
+        'id': row['id'],
+        'trip': row['trip_id'],
+        'trip_name': row['trip__trip_name'],
+        'date': row['date'].isoformat(),
+        'category': row['category'],
+        'description': row['description'] or '',
+        'amount': amount,
+        'currency': currency,
+        'original_amount': str(row['amount']),
+        'original_currency': row['original_currency'],
+    }
+
+
+def expense_rows(queryset, viewer_currency):
+    """
+    Yield one export dict per expense, converted to `viewer_currency`. Each
+    chunk loads the stored rates of its own currencies and dates and fetches
+    live rates only for currencies not fetched for an earlier chunk, so the
+    first chunk streams without a pass over the whole set.
+    """
+    values = queryset.values(
+        'id', 'trip_id', 'trip__trip_name', 'date', 'category', 'description', 'amount', 'amount_base',
+        'original_currency',
+    ).order_by('date', 'id')
+    converter = ExpenseConverter(viewer_currency, RateHistory([]))
+    size = _chunk_size()
+    for chunk in _batches(values.iterator(chunk_size=size), size):
+        converter.load_more({row['original_currency'] for row in chunk}, (row['date'] for row in chunk))
+        for row in chunk:
+            converter.need(row['original_currency'], row['date'], row['amount_base'] is not None)
+        converter.resolve()
+        for row in chunk:
+            yield _expense_row(row, converter)
+
+
+def trip_rates(queryset, viewer_currency):
+    """Today's rates into `viewer_currency` for the trips of `queryset`. Call it before streaming."""
+    currencies = set(queryset.order_by().values_list('currency', flat=True).distinct())
+    return get_rate_service().get_rates(currencies - {viewer_currency}, viewer_currency)
+
+
+def trip_rows(queryset, viewer_currency, rates):
+    """Yield one export dict per trip, budget converted to `viewer_currency` with resolved `rates`"""
+    values = queryset.values(
+        'id', 'trip_name', 'destination', 'start_date', 'end_date', 'traveler_type',
+        'total_budget', 'currency', 'savings'
+    ).order_by('start_date', 'id')
+    for row in values.iterator(chunk_size=_chunk_size()):
+        budget, currency = _convert(row['total_budget'], row['currency'], rates, viewer_currency)
+        yield {
+            'id': row['id'],
+            'trip_name': row['trip_name'],
+            'destination': row['destination'],
+            'start_date': row['start_date'].isoformat(),
+            'end_date': row['end_date'].isoformat(),
+            'traveler_type': row['traveler_type'],
+            'total_budget': budget,
+            'currency': currency,
+            'original_total_budget': str(row['total_budget']),
+            'original_currency': row['currency'],
+            'savings': str(row['savings']),
+        }
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for streaming"""
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows, fields):
+    writer = csv.DictWriter(_Echo(), fieldnames=fields)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def export_response(rows, fields, file_type, filename):
+    """StreamingHttpResponse of `rows` as CSV or NDJSON"""
+    lines = _csv_lines(rows, fields) if file_type == 'csv' else _ndjson_lines(rows)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[file_type])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_type}"'
+    return response
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the exchange rate API, answering GET /<BASE> like
+HTTPRateProvider expects. Latency and the share of 503 answers can be
+changed while it runs, so the rate service's timeout, circuit breaker,
+negative cache and stale fallback can be driven against it
+(`manage.py serve_fake_rates`, `manage.py verify_rate_fallbacks`).
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .benchmark_data import fake_rate_tables
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        number = server.count_request()
+        base = self.path.strip('/').split('/')[-1].upper()
+        if server.on_request:
+            server.on_request(number, self.path)
+
+        time.sleep(server.delay)
+        if random.random() < server.fail_rate:
+            self._send(503, {"error": "fake outage"})
+        elif base not in server.tables:
+            self._send(404, {"error": f"unknown base {base}"})
+        else:
+            self._send(200, {"base": base, "rates": server.tables[base]})
+
+    def _send(self, code, body):
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and went away
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeRateServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server for `tables` (default fake_rate_tables()). `delay`
+    and `fail_rate` may be changed between requests; `requests` counts them.
+    Port 0 picks a free port, see `url`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, tables=None, delay=0.0, fail_rate=0.0, on_request=None):
+        super().__init__((host, port), _Handler)
+        self.tables = tables if tables is not None else fake_rate_tables()
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.on_request = on_request
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """URL template for HTTPRateProvider"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{{base}}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def start(self):
+        """Serve from a daemon thread; stop with shutdown()"""
+        thread = threading.Thread(target=self.serve_forever, name='fake-rates', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,109 @@
+"""
+Streaming bulk import of expenses into a trip.
+
+Rows are parsed one at a time from CSV or NDJSON, validated with the
+ExpenseSerializer field rules, given their base-currency amounts with one
+rate lookup per chunk and inserted in chunks with bulk_create. Each
+chunk is committed in its own transaction together with its rollup update
+and a single trip version bump, so neither the upload nor the parsed rows
+are ever held in memory as a whole.
+"""
+
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from . import rollups
+from .base_amounts import fill_base_amounts
+from .models import Trip, Expense
+from .serializers import ExpenseSerializer
+
+IMPORT_FIELDS = ["amount", "date", "category", "description"]
+
+# Errors beyond this many are counted but not returned
+MAX_REPORTED_ERRORS = 1000
+
+
+class ExpenseImportSerializer(ExpenseSerializer):
+    """ExpenseSerializer rules for one imported row; the trip comes from the URL"""
+    class Meta(ExpenseSerializer.Meta):
+        fields = IMPORT_FIELDS
+
+
+class RowError(Exception):
+    """A row that could not be parsed at all."""
+
+
+def _decoded_lines(stream):
+    for line in stream:
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def parse_csv(stream):
+    """Yield (row_number, row dict) from a CSV stream with a header line"""
+    reader = csv.DictReader(_decoded_lines(stream))
+    for row in reader:
+        # Header is line 1, so data rows start at 2
+        yield reader.line_num, {key: value for key, value in row.items() if key in IMPORT_FIELDS}
+
+
+def parse_ndjson(stream):
+    """Yield (row_number, row dict or RowError) from newline-delimited JSON"""
+    for number, line in enumerate(_decoded_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield number, RowError(f"Invalid JSON: {e}")
+            continue
+        yield number, row
+
+
+def _save_batch(trip, batch):
+    # Rates are looked up before the transaction opens
+    fill_base_amounts(batch)
+    with transaction.atomic():
+        created = Expense.objects.bulk_create(batch)
+        rollups.record_batch(created)
+        Trip.bump_data_version(trip.id)
+    return len(created)
+
+
+def import_expenses(trip, user, rows, batch_size=None):
+    """
+    Validate and insert parsed rows for `trip`. Valid rows are committed in
+    batches even if other rows fail; returns counts and per-row errors.
+    """
+    batch_size = batch_size or getattr(settings, 'EXPENSE_IMPORT_BATCH_SIZE', 1000)
+    result = {'created': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    for number, row in rows:
+        if isinstance(row, RowError):
+            errors = {'non_field_errors': [str(row)]}
+        else:
+            serializer = ExpenseImportSerializer(data=row)
+            if serializer.is_valid():
+                batch.append(Expense(
+                    trip=trip,
+                    original_currency=user.currency,  # same as ExpenseSerializer.create
+                    **serializer.validated_data
+                ))
+                if len(batch) >= batch_size:
+                    result['created'] += _save_batch(trip, batch)
+                    batch = []
+                continue
+            errors = serializer.errors
+
+        result['failed'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'row': number, 'errors': errors})
+
+    if batch:
+        result['created'] += _save_batch(trip, batch)
+    return result
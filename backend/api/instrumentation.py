@@ -0,0 +1,177 @@
+"""
+Per-request performance instrumentation.
+
+ServerTimingMiddleware opens a RequestMetrics for each request in a context
+variable; hooks in the database wrapper, the exchange rate service and the
+rate-memo serializers add to it, and the totals go out as a Server-Timing
+header plus one JSON log line on the "api.performance" logger. Outside a
+request every hook is a single ContextVar lookup, and inside one a counter
+increment and a perf_counter() call, so it is cheap enough to leave on.
+Responses converted with stale fallback rate tables also get an
+X-Rates-Stale header listing their base currencies.
+
+    Server-Timing: sql;dur=12.4;desc="9 queries", rates;dur=0.3;desc="3 hits, 0 misses",
+                   rate-fetch;dur=0.0, serialize;dur=4.1, total;dur=21.7
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('api.performance')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Counters and timings collected while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.rate_hits = 0
+        self.rate_misses = 0
+        self.stale_rates = set()  # base currencies served from stale tables
+        self.timings = {}  # name -> milliseconds
+        self._active = set()
+
+    def add_time(self, name, ms):
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        entries = [
+            f'sql;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"',
+            f'rates;dur={self.timings.get("rates", 0.0):.1f};desc="{self.rate_hits} hits, {self.rate_misses} misses"',
+        ]
+        entries += [
+            f'{name};dur={ms:.1f}' for name, ms in self.timings.items() if name != 'rates'
+        ]
+        entries.append(f'total;dur={self.total_ms():.1f}')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_ms(), 2),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_ms, 2),
+            'rate_hits': self.rate_hits,
+            'rate_misses': self.rate_misses,
+            'rates_stale': sorted(self.stale_rates),
+            **{f'{name.replace("-", "_")}_ms': round(ms, 2) for name, ms in self.timings.items()},
+        }
+
+
+def current_metrics():
+    """The current request's metrics, or None outside an instrumented request"""
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the block's duration to timing `name` of the current request.
+    Nested blocks with the same name (e.g. a list serializer and its child)
+    are counted once.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics._active:
+        yield
+        return
+    metrics._active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._active.discard(name)
+        metrics.add_time(name, (time.perf_counter() - started) * 1000)
+
+
+def record_rate_lookup(hit):
+    """Count an exchange rate answered from cached tables (hit) or needing a fetch"""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.rate_hits += 1
+        else:
+            metrics.rate_misses += 1
+
+
+def record_stale_rates(base):
+    """Note that the current request converts with a stale table for `base`"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.stale_rates.add(base)
+
+
+def _sql_timer(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_ms += (time.perf_counter() - started) * 1000
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    # connection_created fires on every (re)connect of the same wrapper object
+    if _sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_timer)
+
+
+connection_created.connect(install_sql_timer)
+
+
+class ServerTimingMiddleware:
+    """Adds Server-Timing to responses and logs one metrics line per request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.log_min_ms = getattr(settings, 'PERFORMANCE_LOG_MIN_MS', 0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current.set(RequestMetrics())
+        try:
+            response = self.get_response(request)
+            return self._finish(request, response)
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(RequestMetrics())
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response)
+        finally:
+            _current.reset(token)
+
+    def _finish(self, request, response):
+        metrics = _current.get()
+        response['Server-Timing'] = metrics.server_timing()
+        if metrics.stale_rates:
+            response['X-Rates-Stale'] = ', '.join(sorted(metrics.stale_rates))
+
+        record = metrics.as_dict()
+        if record['total_ms'] >= self.log_min_ms:
+            record.update(method=request.method, path=request.path, status=response.status_code)
+            logger.info(json.dumps(record))
+        return response
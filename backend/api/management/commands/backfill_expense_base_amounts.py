@@ -0,0 +1,58 @@
+"""
+Fill Expense.amount_base and its rate snapshot for expenses that have none
+(written before the column existed, or while no rate was available), at
+today's rates. Expenses are processed in primary key order, one transaction
+per batch, and the spending rollups and data versions of the touched trips
+are refreshed in the same transaction.
+
+    python manage.py backfill_expense_base_amounts [--batch-size 1000] [--trip 12]
+    python manage.py backfill_expense_base_amounts --all   # recompute every expense, e.g. after changing EXPENSE_BASE_CURRENCY
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.base_amounts import BASE_FIELDS, base_currency, fill_base_amounts
+from api.models import Trip, Expense
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Fill the base-currency amount and rate snapshot of expenses that have none"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--trip', type=int, action='append', dest='trip_ids',
+                            help="Only this trip (repeatable)")
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute expenses that already have a base amount too")
+
+    def handle(self, *args, **options):
+        expenses = Expense.objects.all()
+        if not options['all']:
+            expenses = expenses.filter(amount_base__isnull=True)
+        if options['trip_ids']:
+            expenses = expenses.filter(trip_id__in=options['trip_ids'])
+
+        filled = missing = 0
+        last_pk = 0
+        while True:
+            batch = list(expenses.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            count = fill_base_amounts(batch)
+            trip_ids = {expense.trip_id for expense in batch}
+            with transaction.atomic():
+                Expense.objects.bulk_update(batch, BASE_FIELDS)
+                rebuild_rollups(trip_ids)
+                Trip.bump_data_version(*trip_ids)
+
+            filled += count
+            missing += len(batch) - count
+            self.stdout.write(f"{filled + missing} expense(s) processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Filled {filled} base amount(s) in {base_currency()}"))
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} expense(s) left empty: no rate available"))
@@ -0,0 +1,99 @@
+"""
+Compares the old accessible-trips filter, Q(user=user) | Q(tripmate=user)
+plus DISTINCT, with Trip.objects.accessible_by(user), and checks both
+return the same rows. Test data is created inside a transaction that is
+rolled back, so it can be run against a development database.
+
+    python manage.py benchmark_accessible_trips --trips 10000 [--shared 0.3] [--runs 5]
+"""
+
+from datetime import date, timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from api.models import CustomUser, Trip, Expense
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark accessible_by() against the OR-join plus DISTINCT trip filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=10000, help="Trips the benchmark user can access")
+        parser.add_argument('--shared', type=float, default=0.3, help="Fraction shared with the user as tripmate")
+        parser.add_argument('--tripmates', type=int, default=3, help="Other tripmates on every trip")
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _time(self, fn, runs):
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _run(self, options):
+        users = [
+            CustomUser.objects.create_user(
+                f"benchmark-access-{i}@example.com", "benchmark", first_name="Bench", last_name=str(i)
+            )
+            for i in range(options['tripmates'] + 2)
+        ]
+        user, owner, others = users[0], users[1], users[2:]
+
+        count = options['trips']
+        shared = int(count * options['shared'])
+        start = date(2024, 1, 1)
+        trips = Trip.objects.bulk_create(
+            Trip(
+                user=owner if i < shared else user, trip_name=f"bench {i}", destination="London",
+                start_date=start + timedelta(days=i % 365), end_date=start + timedelta(days=i % 365 + 7),
+                total_budget=1000,
+            )
+            for i in range(count)
+        )
+        Through = Trip.tripmate.through
+        Through.objects.bulk_create(
+            Through(trip_id=trip.id, customuser_id=member.id)
+            for i, trip in enumerate(trips)
+            for member in ([user] if i < shared else []) + others
+        )
+        Expense.objects.bulk_create(
+            Expense(trip=trip, amount=10, date=trip.start_date, category="food") for trip in trips
+        )
+
+        old_trips = lambda: Trip.objects.filter(Q(user=user) | Q(tripmate=user)).distinct()
+        old_expenses = lambda: Expense.objects.filter(Q(trip__user=user) | Q(trip__tripmate=user)).distinct()
+        cases = [
+            ("trip ids", lambda: list(old_trips().order_by('id').values_list('id', flat=True)),
+             lambda: list(Trip.objects.accessible_by(user).order_by('id').values_list('id', flat=True))),
+            ("trip page", lambda: list(old_trips().order_by('start_date', 'id')[:100]),
+             lambda: list(Trip.objects.accessible_by(user).order_by('start_date', 'id')[:100])),
+            ("trip count", lambda: old_trips().count(),
+             lambda: Trip.objects.accessible_by(user).count()),
+            ("expense ids", lambda: list(old_expenses().order_by('id').values_list('id', flat=True)),
+             lambda: list(Expense.objects.accessible_by(user).order_by('id').values_list('id', flat=True))),
+        ]
+
+        self.stdout.write(f"{count} trips ({shared} shared), best of {options['runs']} runs")
+        self.stdout.write(f"{'query':<12} {'distinct ms':>12} {'accessible_by ms':>17} {'match':>6}")
+        for label, old, new in cases:
+            old_ms, old_result = self._time(old, options['runs'])
+            new_ms, new_result = self._time(new, options['runs'])
+            match = "yes" if old_result == new_result else "NO"
+            self.stdout.write(f"{label:<12} {old_ms:>12.2f} {new_ms:>17.2f} {match:>6}")
@@ -0,0 +1,91 @@
+"""
+Compares pricing a destination grid with one recommend_budget call per
+item (what the planning UI does today) against one recommend_budgets call,
+and checks both return the same numbers. The grid only takes cities whose
+local currency the configured rate provider can convert, so every item is
+priced rather than compared as matching errors.
+
+    python manage.py benchmark_budget_batch [--cities 50] [--currency GBP] [--runs 5]
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.budget import recommend_budget, recommend_budgets, CityNotFound, BudgetUnavailable, TRAVELER_MULTIPLIERS
+from api.cost_data import get_cost_table
+from api.exchange_rates import get_rate_service
+
+
+class Command(BaseCommand):
+    help = "Benchmark batch budget pricing against the single-call loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cities', type=int, default=50, help="Cities in the grid")
+        parser.add_argument('--durations', type=int, nargs='+', default=[7, 14])
+        parser.add_argument('--currency', default='GBP')
+        parser.add_argument('--runs', type=int, default=5)
+
+    def _loop(self, items, currency):
+        results = []
+        for item in items:
+            try:
+                results.append(recommend_budget(item['city'], item['traveler_type'], item['duration'], currency))
+            except (CityNotFound, BudgetUnavailable) as e:
+                results.append({'city': item['city'], 'error': str(e)})
+        return results
+
+    def _time(self, fn, runs):
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _priceable_cities(self, currency, limit):
+        # Cities whose local currency converts into `currency`; this also warms
+        # the rate cache so neither side pays for the first fetch
+        table = get_cost_table()
+        service_logger = logging.getLogger('api.exchange_rates')
+        level = service_logger.level
+        # Every unquoted currency is an expected failure here, not worth a log line
+        service_logger.setLevel(logging.CRITICAL)
+        try:
+            rates = get_rate_service().get_rates(set(table.currencies) - {currency}, currency)
+        finally:
+            service_logger.setLevel(level)
+        convertible = set(rates) | {currency}
+        cities = [name for name, local in zip(table.names, table.currencies) if local in convertible]
+        skipped = len(set(table.currencies) - convertible)
+        if skipped:
+            self.stdout.write(f"Skipping cities in {skipped} currencies the rate provider does not quote")
+        return cities[:limit]
+
+    def handle(self, *args, **options):
+        currency = options['currency']
+        cities = self._priceable_cities(currency, options['cities'])
+        if not cities:
+            raise CommandError(f"No city's currency converts into {currency} with the configured rate provider")
+        items = [
+            {'city': city, 'traveler_type': traveler_type, 'duration': duration}
+            for city in cities for traveler_type in TRAVELER_MULTIPLIERS for duration in options['durations']
+        ]
+
+        loop_ms, loop_results = self._time(lambda: self._loop(items, currency), options['runs'])
+        batch_ms, batch_results = self._time(lambda: recommend_budgets(items, currency), options['runs'])
+
+        self.stdout.write(f"{len(items)} items ({len(cities)} cities), best of {options['runs']} runs")
+        self.stdout.write(f"single-call loop: {loop_ms:8.2f} ms")
+        self.stdout.write(f"batch:            {batch_ms:8.2f} ms ({loop_ms / batch_ms:.1f}x)")
+
+        errors = sum(1 for result in loop_results if 'error' in result)
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{errors} of {len(items)} items could not be priced"))
+        if loop_results == batch_results:
+            self.stdout.write(self.style.SUCCESS(f"Results match ({len(items) - errors} priced items)"))
+        else:
+            mismatched = sum(1 for a, b in zip(loop_results, batch_results) if a != b)
+            raise CommandError(f"{mismatched} results differ")
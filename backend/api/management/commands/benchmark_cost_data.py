@@ -0,0 +1,105 @@
+"""
+Measures what loading the cost-of-living data costs a worker: import time of
+api.views, time to load the data for the first lookup, time of the first
+city search after that, memory held by the loaded data and peak RSS, each in
+a fresh interpreter. Timings and memory come from separate interpreters, as
+tracemalloc slows allocation-heavy loads several times over. Compares the old
+eager dict-of-dicts load with the lazy column table, from JSON and (with
+--snapshot) from a binary snapshot.
+
+    python manage.py benchmark_cost_data [--snapshot PATH] [--runs 5]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cost_data import CostTable, source_path
+
+# Runs in a child interpreter; prints one JSON line of measurements
+CHILD = r"""
+import json, resource, sys, time, tracemalloc
+mode, traced = sys.argv[1], sys.argv[2] == "memory"
+started = time.perf_counter()
+import django
+django.setup()
+import api.views
+imported = time.perf_counter()
+if traced:
+    tracemalloc.start()
+if mode == "eager":
+    # What api/views.py used to do at import time
+    from api.cost_data import source_path
+    with open(source_path()) as f:
+        data = json.load(f)
+    data["Paris, France"]
+else:
+    from api.budget import get_city_cost_data
+    get_city_cost_data("Paris")
+loaded = time.perf_counter()
+if traced:
+    print(json.dumps({"data_kb": tracemalloc.get_traced_memory()[0] // 1024}))
+    sys.exit()
+if mode == "eager":
+    [name for name in data if "par" in name.lower()]
+else:
+    from api.budget import search_cities
+    search_cities("par")
+searched = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "load_ms": (loaded - imported) * 1000,
+    "search_ms": (searched - loaded) * 1000,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Benchmark import time, load time and memory of the cost of living data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', default=None, help="Snapshot to benchmark (compiled if missing)")
+        parser.add_argument('--runs', type=int, default=5)
+
+    def _child(self, mode, measure, env):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, mode, measure], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def _measure(self, mode, env, runs):
+        results = []
+        for _ in range(runs):
+            results.append({**self._child(mode, 'time', env), **self._child(mode, 'memory', env)})
+        # Median of each metric
+        return {key: sorted(r[key] for r in results)[len(results) // 2] for key in results[0]}
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.pop('COST_OF_LIVING_SNAPSHOT', None)
+
+        snapshot = options['snapshot'] or os.path.join(tempfile.mkdtemp(), 'cost_of_living.bin')
+        if not os.path.exists(snapshot):
+            CostTable.from_json(source_path()).write_snapshot(snapshot)
+
+        modes = [
+            ('eager dict (old)', 'eager', env),
+            ('lazy columns, JSON', 'lazy', env),
+            ('lazy columns, snapshot', 'lazy', dict(env, COST_OF_LIVING_SNAPSHOT=snapshot)),
+        ]
+        self.stdout.write(
+            f"{'mode':<24} {'import ms':>10} {'load ms':>8} {'search ms':>10} {'data KB':>8} {'max RSS KB':>11}"
+        )
+        for label, mode, mode_env in modes:
+            result = self._measure(mode, mode_env, options['runs'])
+            self.stdout.write(
+                f"{label:<24} {result['import_ms']:>10.1f} {result['load_ms']:>8.1f} {result['search_ms']:>10.1f} "
+                f"{result['data_kb']:>8} {result['max_rss_kb']:>11}"
+            )
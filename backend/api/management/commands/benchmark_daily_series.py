@@ -0,0 +1,66 @@
+"""
+Shows that calculate_trip_analytics runs a constant number of queries
+however long the trip is. Test data is created inside a transaction that is
+rolled back, so it can be run against a development database.
+
+    python manage.py benchmark_daily_series --lengths 7 30 90 365
+"""
+
+from datetime import date, timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.analytics import spending_series
+from api.models import CustomUser, Trip, Expense
+from api.rollups import record_batch
+from api.views import calculate_trip_analytics
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure query count and time of the trip spending series as trip length grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lengths', nargs='+', type=int, default=[7, 30, 90, 365])
+        parser.add_argument('--expenses-per-day', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['lengths'], options['expenses_per_day'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, lengths, per_day):
+        user = CustomUser.objects.create_user(
+            "benchmark-daily-series@example.com", "benchmark", first_name="Bench", last_name="Mark"
+        )
+        self.stdout.write(f"{'days':>6} {'bucket':>7} {'queries':>8} {'ms':>9}")
+        for length in lengths:
+            start = date(2024, 1, 1)
+            trip = Trip.objects.create(
+                user=user, trip_name=f"bench {length}", destination="London",
+                start_date=start, end_date=start + timedelta(days=length - 1), total_budget=1000,
+            )
+            expenses = Expense.objects.bulk_create(
+                Expense(trip=trip, amount=10, date=start + timedelta(days=day), category="food")
+                for day in range(length) for _ in range(per_day)
+            )
+            record_batch(expenses)
+
+            runs = [('full', lambda: calculate_trip_analytics(trip))]
+            runs += [(bucket, lambda bucket=bucket: spending_series(trip, bucket))
+                     for bucket in ('day', 'week', 'month')]
+            for label, run in runs:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    run()
+                    elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(f"{length:>6} {label:>7} {len(queries):>8} {elapsed:>9.2f}")
@@ -0,0 +1,256 @@
+"""
+Endpoint benchmark suite. Regenerates a synthetic data set (see
+api/benchmark_data.py), then calls every endpoint in api/urls.py through the
+test client with a real JWT, recording latency, query count and peak Python
+memory per endpoint. Write requests run inside a rolled-back transaction so
+every run sees the same data. Rates come from an in-process provider.
+
+Runs only under the SQLite benchmark profile, because it flushes the database:
+
+    python manage.py benchmark_endpoints --settings=backend.settings_benchmark \
+        [--users 10 --trips 10 --expenses 50 --tripmates 2] [--runs 10] \
+        [--output results.json] [--compare baseline.json --threshold 0.25]
+
+With --compare, endpoints that got slower by more than --threshold, run more
+queries or use more memory than the baseline are flagged and the command
+exits with an error.
+"""
+
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmark_data import generate
+from api.models import Trip
+from api.response_cache import analytics_cache
+
+# Differences smaller than these are noise, whatever the ratio
+MIN_LATENCY_DELTA_MS = 1.0
+MIN_MEMORY_DELTA_KB = 64
+
+
+class _QueryCounter:
+    """execute_wrapper counting statements, except the savepoints around write requests"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if 'SAVEPOINT' not in sql:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _endpoints(trip, expense, other_user, tripmate):
+    """(name, method, path, data, format) for every endpoint in api/urls.py"""
+    days = (trip.end_date - trip.start_date).days + 1
+    trip_body = {
+        'trip_name': trip.trip_name, 'destination': trip.destination,
+        'start_date': str(trip.start_date), 'end_date': str(trip.end_date),
+        'total_budget': str(trip.total_budget), 'traveler_type': trip.traveler_type,
+    }
+    expense_body = {
+        'trip': trip.id, 'amount': '42.50', 'date': str(trip.start_date),
+        'category': 'food', 'description': 'benchmark',
+    }
+    import_rows = "amount,date,category,description\n" + "".join(
+        f"{10 + i % 90}.00,{trip.start_date},other,row {i}\n" for i in range(200)
+    )
+    return [
+        ("trip list", "get", "/api/trips/", None, None),
+        ("trip list page", "get", "/api/trips/?page_size=20", None, None),
+        ("trip create", "post", "/api/trips/", trip_body, 'json'),
+        ("trip update", "put", f"/api/trips/{trip.id}/update/", trip_body, 'json'),
+        ("trip delete", "delete", f"/api/trips/{trip.id}/", None, None),
+        ("all trips analytics", "get", "/api/trips/analytics/", None, None),
+        ("trip analytics", "get", f"/api/trips/{trip.id}/analytics/", None, None),
+        ("expense list", "get", "/api/expenses/", None, None),
+        ("expense list page", "get", "/api/expenses/?page_size=100", None, None),
+        ("expense create", "post", "/api/expenses/", expense_body, 'json'),
+        ("expense update", "put", f"/api/expenses/{expense.id}/update/", expense_body, 'json'),
+        ("expense delete", "delete", f"/api/expenses/{expense.id}/", None, None),
+        ("expense import (200 rows)", "post", f"/api/trips/{trip.id}/expenses/import/?type=csv",
+         import_rows, 'csv'),
+        ("trip expense export", "get", f"/api/trips/{trip.id}/expenses/export/", None, None),
+        ("expense export", "get", "/api/expenses/export/?type=ndjson", None, None),
+        ("trip export", "get", "/api/trips/export/", None, None),
+        ("budget recommendation", "post", "/api/budget-recommendation/",
+         {'city': trip.destination, 'traveler_type': 'medium', 'duration': days}, 'json'),
+        ("budget batch (8x3)", "post", "/api/budget-recommendation/batch/",
+         {'cities': ["Paris", "London", "Tokyo", "New York", "Rome", "Barcelona", "Sydney", "Toronto"],
+          'traveler_types': ["budget", "medium", "luxury"]}, 'json'),
+        ("city search", "get", "/api/cities/?q=san", None, None),
+        ("tripmate list", "get", f"/api/trips/{trip.id}/tripmate/", None, None),
+        ("tripmate add", "post", f"/api/trips/{trip.id}/tripmate/", {'email': other_user.email}, 'json'),
+        ("tripmate remove", "delete", f"/api/trips/{trip.id}/tripmate/", {'email': tripmate.email}, 'json'),
+        ("user verify", "get", f"/api/users/verify/?email={other_user.email}", None, None),
+        ("async all trips analytics", "get", "/api/async/trips/analytics/", None, None),
+        ("async trip analytics", "get", f"/api/async/trips/{trip.id}/analytics/", None, None),
+        ("async budget recommendation", "post", "/api/async/budget-recommendation/",
+         {'city': trip.destination, 'duration': days}, 'json'),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark every api endpoint on synthetic data and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--trips', type=int, default=10, help="Trips per user")
+        parser.add_argument('--expenses', type=int, default=50, help="Expenses per trip")
+        parser.add_argument('--tripmates', type=int, default=2, help="Tripmates per trip")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--runs', type=int, default=10, help="Timed runs per endpoint")
+        parser.add_argument('--warm', action='store_true', help="Keep the analytics response cache between runs")
+        parser.add_argument('--only', nargs='+', default=None, help="Benchmark endpoints whose name contains any of these")
+        parser.add_argument('--output', default='benchmark_results.json')
+        parser.add_argument('--compare', default=None, help="Earlier results file to flag regressions against")
+        parser.add_argument('--threshold', type=float, default=0.25, help="Allowed relative slowdown / memory growth")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK_PROFILE', False):
+            raise CommandError("Run with --settings=backend.settings_benchmark; this command flushes the database")
+
+        call_command('migrate', verbosity=0)
+        call_command('flush', interactive=False, verbosity=0)
+        started = time.perf_counter()
+        users = generate(
+            users=options['users'], trips_per_user=options['trips'], expenses_per_trip=options['expenses'],
+            tripmates_per_trip=options['tripmates'], seed=options['seed'],
+        )
+        self.stdout.write(f"Generated data in {time.perf_counter() - started:.1f}s")
+
+        user, other_user = users[0], users[-1]
+        trip = Trip.objects.filter(user=user).order_by('id').first()
+        expense = trip.expenses.order_by('id').first()
+        # "tripmate add" needs a user not on the trip yet and "tripmate
+        # remove" a current tripmate, whichever tripmates were generated
+        trip.tripmate.remove(other_user)
+        tripmate = trip.tripmate.order_by('id').first() or other_user
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+        endpoints = _endpoints(trip, expense, other_user, tripmate)
+        if options['only']:
+            endpoints = [e for e in endpoints if any(word in e[0] for word in options['only'])]
+
+        results = {}
+        self.stdout.write(f"{'endpoint':<30} {'status':>6} {'median ms':>10} {'p95 ms':>8} {'queries':>8} {'peak KB':>8}")
+        for name, method, path, data, fmt in endpoints:
+            results[name] = self._measure(client, method, path, data, fmt, options['runs'], options['warm'])
+            r = results[name]
+            self.stdout.write(
+                f"{name:<30} {r['status']:>6} {r['median_ms']:>10.2f} {r['p95_ms']:>8.2f} "
+                f"{r['queries']:>8} {r['peak_kb']:>8}"
+            )
+
+        report = {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'data': {key: options[key] for key in ('users', 'trips', 'expenses', 'tripmates', 'seed')},
+                'runs': options['runs'],
+                'warm': options['warm'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f"Wrote {options['output']}")
+
+        if options['compare']:
+            self._compare(report, options['compare'], options['threshold'])
+
+    def _call(self, client, method, path, data, fmt):
+        if fmt == 'csv':
+            response = client.post(path, data, content_type='text/csv')
+        else:
+            response = getattr(client, method)(path, data, format=fmt)
+        # Streamed bodies are produced while being consumed; time that too
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def _request(self, client, method, path, data, fmt):
+        if method == 'get':
+            return self._call(client, method, path, data, fmt)
+        with transaction.atomic():
+            response = self._call(client, method, path, data, fmt)
+            transaction.set_rollback(True)
+        return response
+
+    def _measure(self, client, method, path, data, fmt, runs, warm):
+        # One untimed call warms imports, the cost table and the rate cache
+        response = self._request(client, method, path, data, fmt)
+
+        timings = []
+        for _ in range(runs):
+            if not warm:
+                analytics_cache.clear()
+            queries = _QueryCounter()
+            with connection.execute_wrapper(queries):
+                started = time.perf_counter()
+                response = self._request(client, method, path, data, fmt)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        if not warm:
+            analytics_cache.clear()
+        tracemalloc.start()
+        try:
+            self._request(client, method, path, data, fmt)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'method': method.upper(),
+            'path': path,
+            'status': response.status_code,
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'min_ms': round(timings[0], 3),
+            'queries': queries.count,
+            'peak_kb': peak // 1024,
+        }
+
+    def _compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+
+        regressions = []
+        for name, current in report['results'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if (current['median_ms'] > before['median_ms'] * (1 + threshold)
+                    and current['median_ms'] - before['median_ms'] > MIN_LATENCY_DELTA_MS):
+                regressions.append(f"{name}: median {before['median_ms']:.2f} -> {current['median_ms']:.2f} ms")
+            if current['queries'] > before['queries']:
+                regressions.append(f"{name}: queries {before['queries']} -> {current['queries']}")
+            if (current['peak_kb'] > before['peak_kb'] * (1 + threshold)
+                    and current['peak_kb'] - before['peak_kb'] > MIN_MEMORY_DELTA_KB):
+                regressions.append(f"{name}: peak memory {before['peak_kb']} -> {current['peak_kb']} KB")
+            if current['status'] != before['status']:
+                regressions.append(f"{name}: status {before['status']} -> {current['status']}")
+
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
+            return
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {line}"))
+        raise CommandError(f"{len(regressions)} regression(s) against {baseline_path}")
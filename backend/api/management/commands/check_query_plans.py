@@ -0,0 +1,107 @@
+"""
+Query-plan regression check for the api views' main queries.
+
+Runs EXPLAIN for each query and fails if the plan does not use one of the
+expected indexes, so a dropped or unusable index shows up before deploy.
+Written against SQLite plans ("SEARCH ... USING INDEX name"); on PostgreSQL
+sequential scans are disabled for the check so small tables still report
+whether an index is usable.
+
+    python manage.py check_query_plans [--verbose]
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api.analytics import grouped_spending, trip_rollup_rows
+from api.models import CustomUser, Trip, Expense, TripSpendingRollup
+
+# Placeholder ids; EXPLAIN does not need matching rows
+USER_ID = 1
+TRIP_ID = 1
+START, END = date(2024, 1, 1), date(2024, 1, 31)
+
+# The rollup's (trip, date, category, currency) unique index: named after the
+# constraint on PostgreSQL, created inline with the table on SQLite
+ROLLUP_BUCKET_INDEXES = ["rollup_unique_bucket", "sqlite_autoindex_api_tripspendingrollup_1"]
+
+
+def _plan_checks():
+    """(caller, description, queryset, acceptable index names) for each hot query"""
+    return [
+        (
+            "TripAnalyticsView", "trip spending rollup",
+            trip_rollup_rows(Trip(pk=TRIP_ID)),
+            ROLLUP_BUCKET_INDEXES + ["api_tripspendingrollup_trip_id"],
+        ),
+        (
+            "TripAnalyticsView", "daily spending series",
+            TripSpendingRollup.objects.filter(trip_id=TRIP_ID, date__range=(START, END))
+            .values('date').annotate(sum_total=Sum('total')).order_by(),
+            ROLLUP_BUCKET_INDEXES,
+        ),
+        (
+            "ExpenseListCreate", "accessible expenses by date",
+            Expense.objects.accessible_by(CustomUser(pk=USER_ID)).order_by('date', 'pk'),
+            ["expense_trip_date_idx"],
+        ),
+        (
+            "AllTripsAnalyticsView", "grouped spending",
+            grouped_spending([TRIP_ID, TRIP_ID + 1]),
+            # Only the composite indexes: the trip FK index always exists, so
+            # accepting it would let this check pass with both composites dropped
+            ["expense_trip_date_idx", "expense_trip_category_idx"],
+        ),
+        (
+            "Expense", "category breakdown",
+            Expense.objects.filter(trip_id=TRIP_ID).values('category').annotate(total=Sum('amount')).order_by(),
+            ["expense_trip_category_idx"],
+        ),
+        (
+            "TripListCreate", "owned trips by start date",
+            Trip.objects.filter(user_id=USER_ID).order_by('start_date', 'pk'),
+            ["trip_user_start_idx"],
+        ),
+        (
+            "TripListCreate", "tripmate lookup",
+            Trip.objects.filter(tripmate=USER_ID),
+            ["trip_tripmate_user_trip_idx"],
+        ),
+        (
+            "TripListCreate", "accessible trips",
+            Trip.objects.accessible_by(CustomUser(pk=USER_ID)).order_by('start_date', 'pk'),
+            ["trip_tripmate_user_trip_idx"],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the api views' main queries and fail if expected indexes are not used"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose', action='store_true', help="Print every plan")
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for view, description, queryset, indexes in _plan_checks():
+                plan = queryset.explain()
+                used = [name for name in indexes if name in plan]
+                label = f"{view}: {description}"
+                if used:
+                    self.stdout.write(self.style.SUCCESS(f"ok   {label} ({used[0]})"))
+                else:
+                    failures.append(label)
+                    self.stdout.write(self.style.ERROR(f"FAIL {label}: expected one of {', '.join(indexes)}"))
+                if options['verbose'] or not used:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) no longer use their index")
@@ -0,0 +1,28 @@
+"""
+Compile the cost-of-living JSON into the binary snapshot read by
+api/cost_data.py, so workers can start without the frontend tree.
+
+    python manage.py compile_cost_data [--output PATH]
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cost_data import CostTable, source_path
+
+
+class Command(BaseCommand):
+    help = "Write a compact binary snapshot of the cost of living indices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Snapshot path (defaults to settings.COST_OF_LIVING_SNAPSHOT)")
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.COST_OF_LIVING_SNAPSHOT
+        if not output:
+            raise CommandError("Pass --output or set COST_OF_LIVING_SNAPSHOT")
+
+        table = CostTable.from_json(source_path())
+        table.write_snapshot(output)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(table)} cities to {output}"))
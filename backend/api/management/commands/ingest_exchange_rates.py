@@ -0,0 +1,89 @@
+"""
+Store exchange rate snapshots in the ExchangeRate table (api/rate_history.py).
+
+From a JSON file of tables for one day ({"GBP": {"USD": 1.27, ...}, ...},
+dated with --date, default today) or for several days
+({"2024-01-31": {"GBP": {...}}, ...}):
+
+    python manage.py ingest_exchange_rates --file rates.json [--date 2024-01-31]
+
+From a live provider, e.g. once a day from cron, for the given base
+currencies (default EXPENSE_BASE_CURRENCY):
+
+    python manage.py ingest_exchange_rates --provider [api.exchange_rates.HTTPRateProvider] [--base GBP --base USD]
+
+Re-ingesting a day replaces its rates. Every ingest moves the rate history
+version on, which invalidates cached analytics and ETags.
+"""
+
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.base_amounts import base_currency
+from api.exchange_rates import ExchangeRateError
+from api.rate_history import store_rates
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Ingest exchange rate snapshots from a JSON file or a rate provider"
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--file', help="JSON file of rate tables")
+        source.add_argument('--provider', nargs='?', const='api.exchange_rates.HTTPRateProvider',
+                            help="Dotted path of the provider class to fetch today's tables from")
+        parser.add_argument('--base', action='append', dest='bases',
+                            help="Base currency to fetch with --provider (repeatable)")
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help="Date of an undated file's tables (YYYY-MM-DD, default today)")
+
+    def handle(self, *args, **options):
+        day = options['date'] or timezone.localdate()
+        if options['file']:
+            snapshots = self._read_file(options['file'], day)
+        else:
+            snapshots = self._fetch(options['provider'], options['bases'] or [base_currency()], day)
+
+        stored = 0
+        with transaction.atomic():
+            for snapshot_day, tables in sorted(snapshots.items()):
+                for base, table in tables.items():
+                    stored += store_rates(snapshot_day, base, table)
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} rate(s) for {len(snapshots)} day(s)"))
+
+    def _read_file(self, path, day):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+        if not isinstance(data, dict) or not data:
+            raise CommandError(f"{path} does not contain any rate tables")
+
+        days = {key: _parse_date(key) for key in data}
+        if all(days.values()):
+            return {days[key]: tables for key, tables in data.items()}
+        return {day: data}
+
+    def _fetch(self, provider_path, bases, day):
+        provider = import_string(provider_path)()
+        tables = {}
+        for base in bases:
+            try:
+                tables[base] = provider.fetch(base)
+            except ExchangeRateError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Fetched {len(tables[base])} rate(s) for {base}")
+        return {day: tables}
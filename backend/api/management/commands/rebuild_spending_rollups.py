@@ -0,0 +1,36 @@
+"""
+Rebuild or verify the TripSpendingRollup table against raw expenses.
+
+    python manage.py rebuild_spending_rollups            # rebuild all trips
+    python manage.py rebuild_spending_rollups --trip 12  # rebuild one trip
+    python manage.py rebuild_spending_rollups --verify   # report drift only
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rollups import rebuild_rollups, verify_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-trip spending rollups from expenses, or verify them with --verify"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, action='append', dest='trip_ids',
+                            help="Only this trip (repeatable)")
+        parser.add_argument('--verify', action='store_true',
+                            help="Compare rollups with expenses without changing anything")
+
+    def handle(self, *args, **options):
+        trip_ids = options['trip_ids']
+
+        if options['verify']:
+            mismatches = verify_rollups(trip_ids)
+            for bucket, expected, actual in mismatches:
+                self.stdout.write(f"{bucket}: expected {expected}, found {actual}")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} rollup bucket(s) out of date")
+            self.stdout.write(self.style.SUCCESS("Rollups match expenses"))
+            return
+
+        count = rebuild_rollups(trip_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup bucket(s)"))
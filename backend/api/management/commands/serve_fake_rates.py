@@ -0,0 +1,53 @@
+"""
+Local stand-in for the exchange rate API, for trying the rate code paths
+(and the async views under uvicorn) against a slow or failing provider
+without touching the real API. Point the backend at it with
+
+    EXCHANGE_RATE_API_URL="http://127.0.0.1:8001/{base}"
+
+    python manage.py serve_fake_rates [--port 8001] [--delay 2.0] [--fail-rate 0.1] [--file rates.json]
+
+Every request is logged with its running count, so duplicate fetches for
+one base currency are easy to spot. A --delay longer than
+EXCHANGE_RATE_TIMEOUT makes every fetch time out, to watch the circuit
+breaker open and stale tables being served; `manage.py verify_rate_fallbacks`
+checks those paths automatically.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.fake_rates import FakeRateServer
+
+
+class Command(BaseCommand):
+    help = "Serve a fake exchange rate API with configurable latency and failures"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before answering")
+        parser.add_argument('--fail-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+        parser.add_argument('--file', default=None, help="JSON file of {base: {currency: rate}} tables")
+
+    def handle(self, *args, **options):
+        tables = None
+        if options['file']:
+            with open(options['file']) as f:
+                tables = json.load(f)
+
+        server = FakeRateServer(
+            options['host'], options['port'], tables=tables, delay=options['delay'],
+            fail_rate=options['fail_rate'],
+            on_request=lambda number, path: self.stdout.write(f"#{number} GET {path}"),
+        )
+        self.stdout.write(
+            f"Serving fake rates for {', '.join(sorted(server.tables))} on http://{options['host']}:{options['port']}/<BASE>"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,155 @@
+"""
+Checks the exchange rate service's failure handling against a local stand-in
+for the rate API (api/fake_rates.py) that is made slow, failing or unaware
+of a base currency in turn:
+
+- a fetch that times out serves the last good table, marked stale
+- a failed base currency is not fetched again within the negative-cache TTL
+- base currencies the provider does not quote never open the circuit
+- timeouts and 5xx answers open it, after which fetches fail fast without a request
+- after the cooldown one trial fetch closes it again, also from the async path
+
+The server runs in-process on a free port; only the cache keys of the base
+currencies used here are touched.
+
+    python manage.py verify_rate_fallbacks [--timeout 0.5]
+"""
+
+import asyncio
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exchange_rates import (
+    CircuitBreaker, ExchangeRateError, ExchangeRateService, HTTPRateProvider, track_rate_usage,
+)
+from api.fake_rates import FakeRateServer
+
+UNKNOWN_BASES = ["XAA", "XAB", "XAC", "XAD", "XAE"]
+BASES = ["GBP", "USD", "EUR", "JPY", *UNKNOWN_BASES]
+THRESHOLD = 2
+COOLDOWN = 1.5
+NEGATIVE_TTL = 1
+
+
+class Command(BaseCommand):
+    help = "Verify timeouts, negative caching, stale fallback and the circuit breaker against a fake rate API"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=0.5, help="Provider timeout in seconds")
+
+    def handle(self, *args, **options):
+        self.timeout = options['timeout']
+        self.failures = []
+        self.server = FakeRateServer()
+        self.server.start()
+        self.service = ExchangeRateService(
+            HTTPRateProvider(self.server.url, timeout=self.timeout),
+            breaker=CircuitBreaker(threshold=THRESHOLD, cooldown=COOLDOWN),
+            negative_ttl=NEGATIVE_TTL,
+        )
+        self._forget()
+        try:
+            self._run()
+        finally:
+            self._forget()
+            self.server.shutdown()
+            self.server.server_close()
+
+        if self.failures:
+            raise CommandError(f"{len(self.failures)} rate fallback check(s) failed")
+        self.stdout.write(self.style.SUCCESS("Rate fallbacks behave as expected"))
+
+    def _forget(self, bases=BASES):
+        # Drop this check's cached, last good and failed tables
+        keys = []
+        for base in bases:
+            keys += [self.service._cache_key(base), self.service._stale_key(base), self.service._failure_key(base)]
+        cache.delete_many(keys)
+
+    def _fetch(self, base):
+        # (rates or None, stale, seconds, requests sent)
+        requests_before = self.server.requests
+        started = time.perf_counter()
+        with track_rate_usage() as usage:
+            try:
+                rates = self.service.get_table(base)
+            except ExchangeRateError:
+                rates = None
+        return rates, usage.stale, time.perf_counter() - started, self.server.requests - requests_before
+
+    async def _afetch(self, base):
+        with track_rate_usage() as usage:
+            try:
+                rates = await self.service.aget_table(base)
+            except ExchangeRateError:
+                rates = None
+        return rates, usage.stale
+
+    def _check(self, label, ok, detail=""):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f"ok   {label}"))
+        else:
+            self.failures.append(label)
+            self.stdout.write(self.style.ERROR(f"FAIL {label}{': ' + detail if detail else ''}"))
+
+    def _run(self):
+        breaker = self.service.breaker
+        fast = self.timeout / 2
+
+        rates, stale, _, sent = self._fetch('GBP')
+        self._check("fresh fetch", rates is not None and not stale and sent == 1, f"sent {sent}, stale {stale}")
+
+        # Bases the provider does not quote: negatively cached, circuit stays closed
+        for base in UNKNOWN_BASES:
+            self._fetch(base)
+        self._check(
+            f"{len(UNKNOWN_BASES)} unknown bases leave the circuit closed", breaker.state == 'closed', breaker.state
+        )
+        rates, _, _, sent = self._fetch('USD')
+        self._check("uncached base still fetched after unknown bases", rates is not None and sent == 1)
+        rates, _, _, sent = self._fetch(UNKNOWN_BASES[0])
+        self._check("unknown base negatively cached", rates is None and sent == 0, f"sent {sent}")
+
+        # Timeout: the last good table is served, marked stale
+        cache.delete(self.service._cache_key('GBP'))
+        self.server.delay = self.timeout * 2
+        rates, stale, seconds, sent = self._fetch('GBP')
+        self._check(
+            "timeout serves the last good table as stale", rates is not None and stale and sent == 1,
+            f"rates {rates is not None}, stale {stale}, sent {sent}",
+        )
+        self._check("timeout bounded by the provider timeout", seconds < self.timeout * 1.8, f"{seconds:.2f}s")
+        rates, stale, seconds, sent = self._fetch('GBP')
+        self._check(
+            "failed base negatively cached", rates is not None and stale and sent == 0 and seconds < fast,
+            f"sent {sent}, {seconds:.2f}s",
+        )
+
+        # A 5xx answer is the second provider failure and opens the circuit
+        self.server.delay = 0
+        self.server.fail_rate = 1.0
+        cache.delete(self.service._cache_key('USD'))
+        rates, stale, _, sent = self._fetch('USD')
+        self._check("5xx serves the last good table as stale", rates is not None and stale and sent == 1)
+        self._check(f"{THRESHOLD} provider failures open the circuit", breaker.state == 'open', breaker.state)
+        _, _, seconds, sent = self._fetch('JPY')
+        self._check("open circuit fails fast without a request", sent == 0 and seconds < fast, f"sent {sent}, {seconds:.2f}s")
+
+        # After the cooldown one trial fetch closes the circuit, here from the async path
+        self.server.fail_rate = 0.0
+        time.sleep(COOLDOWN + 0.1)
+        requests_before = self.server.requests
+        rates, stale = asyncio.run(self._afetch('EUR'))
+        self._check(
+            "trial fetch after the cooldown closes the circuit",
+            rates is not None and not stale and breaker.state == 'closed' and self.server.requests == requests_before + 1,
+            f"state {breaker.state}",
+        )
+
+        # Once the negative-cache TTL has passed, the failed base is fetched fresh again
+        time.sleep(NEGATIVE_TTL + 0.1)
+        cache.delete(self.service._cache_key('GBP'))
+        rates, stale, _, sent = self._fetch('GBP')
+        self._check("failed base fetched again after the negative TTL", rates is not None and not stale and sent == 1)
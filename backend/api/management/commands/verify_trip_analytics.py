@@ -0,0 +1,191 @@
+"""
+Checks the trip analytics currency math: a trip with many expenses in a few
+currencies must need at most one live rate lookup per currency, and its
+converted totals must match an exact per-expense Decimal conversion at the
+rate of each expense's date to within a cent. Every day of the trip gets its
+own stored rate table, different from the live rates. Also reports how far
+the old convert-and-round-every-row approach drifts.
+A second trip spent only in the viewer's currency, with base-amount rate
+snapshots that differ from today's rates (api/base_amounts.py), must show
+exactly the amounts entered, unconverted, in both analytics reports.
+Test data is created inside a transaction that is rolled back and live rates
+come from the in-process benchmark provider.
+
+    python manage.py verify_trip_analytics [--expenses 5000] [--currencies GBP USD EUR] [--viewer GBP]
+"""
+
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.analytics import all_trips_analytics, trip_analytics, CENT
+from api.base_amounts import base_amount, base_currency, fill_base_amounts
+from api.benchmark_data import BenchmarkRateProvider, CATEGORIES
+from api.exchange_rates import ExchangeRateService, get_rate_service, set_rate_service
+from api.models import CustomUser, Trip, Expense, ExchangeRate
+from api.rate_history import store_rates
+from api.rollups import record_batch
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _CountingRateService(ExchangeRateService):
+    """Counts rate lookups so the check can assert one per currency"""
+
+    def __init__(self, provider):
+        super().__init__(provider)
+        self.lookups = 0
+
+    def get_rate(self, from_currency, to_currency):
+        self.lookups += 1
+        return super().get_rate(from_currency, to_currency)
+
+
+class Command(BaseCommand):
+    help = "Verify trip analytics converts once per currency and matches exact per-expense totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenses', type=int, default=5000)
+        parser.add_argument('--currencies', nargs='+', default=['GBP', 'USD', 'EUR'])
+        parser.add_argument('--viewer', default='GBP', help="Currency of the viewing user")
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        previous = get_rate_service()
+        service = _CountingRateService(BenchmarkRateProvider())
+        set_rate_service(service)
+        try:
+            with transaction.atomic():
+                failures = self._run(service, options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            set_rate_service(previous)
+
+        if failures:
+            for line in failures:
+                self.stdout.write(self.style.ERROR(f"FAIL {line}"))
+            raise CommandError(f"{len(failures)} analytics total(s) outside rounding tolerance")
+        self.stdout.write(self.style.SUCCESS("Analytics totals match exact conversion within rounding"))
+
+    def _store_daily_rates(self, start, options):
+        # One base-currency table per day, drifting away from the live rates
+        base = base_currency()
+        tables = {}
+        for offset in range(options['days']):
+            drift = 1 + Decimal(offset) / 200
+            table = {
+                c: (Decimal(str(get_rate_service().get_rate(base, c))) * drift).quantize(Decimal('0.0001'))
+                for c in options['currencies'] if c != base
+            }
+            store_rates(start + timedelta(days=offset), base, table)
+            tables[start + timedelta(days=offset)] = {**table, base: Decimal(1)}
+        return tables
+
+    def _run(self, service, options):
+        # Only this check's rates; stored history comes back with the rollback
+        ExchangeRate.objects.all().delete()
+        rng = random.Random(options['seed'])
+        viewer = CustomUser.objects.create_user(
+            "verify-trip-analytics@example.com", "verify", first_name="Verify", last_name="Analytics",
+            currency=options['viewer'],
+        )
+        start = date(2024, 1, 1)
+        trip = Trip.objects.create(
+            user=viewer, trip_name="verify", destination="London", start_date=start,
+            end_date=start + timedelta(days=options['days'] - 1), total_budget=Decimal('12345.67'),
+            currency=options['currencies'][0],
+        )
+        tables = self._store_daily_rates(start, options)
+        expenses = [
+            Expense(
+                trip=trip, amount=Decimal(rng.randint(1, 50000)) / 100,
+                date=start + timedelta(days=rng.randrange(options['days'])),
+                category=rng.choice(CATEGORIES), original_currency=rng.choice(options['currencies']),
+            )
+            for _ in range(options['expenses'])
+        ]
+        fill_base_amounts(expenses)
+        expenses = Expense.objects.bulk_create(expenses)
+        record_batch(expenses)
+
+        service.lookups = 0
+        result = trip_analytics(trip, viewer)
+        lookups = service.lookups
+
+        # Reference: every expense converted exactly with its day's table, rounded once at the end
+        exact_total = Decimal(0)
+        exact_category = defaultdict(Decimal)
+        exact_daily = defaultdict(Decimal)
+        per_row_rounded = 0.0
+        for expense in expenses:
+            table = tables[expense.date]
+            rate = table[viewer.currency] / table[expense.original_currency]
+            amount = expense.amount * rate
+            exact_total += amount
+            exact_category[expense.category] += amount
+            exact_daily[expense.date.strftime("%Y-%m-%d")] += amount
+            per_row_rounded += round(float(expense.amount) * float(rate), 2)
+
+        failures = []
+        # The trip's own currency is one of the expense currencies
+        foreign = set(options['currencies']) - {viewer.currency}
+        if lookups > len(foreign):
+            failures.append(f"{lookups} live rate lookups for {len(foreign)} foreign currencies")
+
+        def check(label, expected, actual):
+            if abs(expected.quantize(CENT) - Decimal(str(actual))) > CENT:
+                failures.append(f"{label}: expected {expected.quantize(CENT)}, got {actual}")
+
+        check("total_spent", exact_total, result['total_spent'])
+        for category, amount in exact_category.items():
+            check(f"category {category}", amount, result['category_spending'][category])
+        for day, amount in exact_daily.items():
+            check(f"day {day}", amount, result['daily_spending'][day])
+
+        failures += self._check_same_currency(rng, viewer, start, options)
+
+        self.stdout.write(
+            f"{options['expenses']} expenses in {', '.join(options['currencies'])}, viewed in {viewer.currency}"
+        )
+        self.stdout.write(f"live rate lookups:         {lookups}")
+        self.stdout.write(f"exact total:               {exact_total.quantize(CENT)}")
+        self.stdout.write(f"analytics total:           {result['total_spent']:.2f}")
+        self.stdout.write(f"per-row rounded total:     {per_row_rounded:.2f} (drift {per_row_rounded - float(exact_total):+.4f})")
+        return failures
+
+    def _check_same_currency(self, rng, viewer, start, options):
+        trip = Trip.objects.create(
+            user=viewer, trip_name="verify same currency", destination="London", start_date=start,
+            end_date=start + timedelta(days=options['days'] - 1), total_budget=Decimal('500.00'),
+            currency=viewer.currency,
+        )
+        # A snapshot from a day the rate was 4% off today's
+        snapshot = Decimal('1.04') * Decimal(str(get_rate_service().get_rate(viewer.currency, base_currency())))
+        expenses = []
+        for _ in range(100):
+            amount = Decimal(rng.randint(1, 50000)) / 100
+            expenses.append(Expense(
+                trip=trip, amount=amount, date=start + timedelta(days=rng.randrange(options['days'])),
+                category=rng.choice(CATEGORIES), original_currency=viewer.currency,
+                amount_base=base_amount(amount, snapshot), base_rate=snapshot,
+            ))
+        record_batch(Expense.objects.bulk_create(expenses))
+        exact = sum(expense.amount for expense in expenses)
+
+        failures = []
+        result = trip_analytics(trip, viewer)
+        if Decimal(str(result['total_spent'])) != exact or result['is_converted']:
+            failures.append(f"same-currency trip: expected {exact} unconverted, got {result['total_spent']}")
+        summary = next(t for t in all_trips_analytics(viewer)['trips'] if t['trip_id'] == trip.id)
+        if Decimal(str(summary['total_spent'])) != exact or summary['is_converted']:
+            failures.append(f"same-currency trip in all trips: expected {exact} unconverted, got {summary['total_spent']}")
+        return failures
@@ -0,0 +1,55 @@
+"""
+Prefetch the exchange rate tables of every currency in use (api/rate_warming.py)
+and report the fetch latency per base currency.
+
+    python manage.py warm_rate_cache [--workers 4] [--currency GBP --currency USD]
+    python manage.py warm_rate_cache --loop [--interval 3300]   # refresh before every TTL expiry
+
+Warming from a separate process only helps web processes that share its
+cache backend (Redis, Memcached, database). With the default per-process
+LocMemCache set EXCHANGE_RATE_WARMING = True to warm inside each web process.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rate_warming import currencies_in_use, warm_interval, warm_rates
+
+
+class Command(BaseCommand):
+    help = "Prefetch exchange rate tables for all currencies in use and report fetch latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Concurrent fetches")
+        parser.add_argument('--currency', action='append', dest='currencies',
+                            help="Only this base currency (repeatable)")
+        parser.add_argument('--loop', action='store_true', help="Keep refreshing before the tables expire")
+        parser.add_argument('--interval', type=int, default=None,
+                            help="Seconds between rounds with --loop (default: TTL minus EXCHANGE_RATE_WARM_MARGIN)")
+
+    def handle(self, *args, **options):
+        while True:
+            failed = self._round(options)
+            if not options['loop']:
+                break
+            interval = options['interval'] or warm_interval()
+            self.stdout.write(f"Next refresh in {interval}s")
+            time.sleep(interval)
+
+        if failed:
+            raise CommandError(f"{failed} rate table(s) could not be fetched")
+
+    def _round(self, options):
+        currencies = options['currencies'] or currencies_in_use()
+        started = time.perf_counter()
+        results = warm_rates(currencies, workers=options['workers'])
+
+        self.stdout.write(f"{'base':<6} {'ms':>8} {'rates':>6}  status")
+        for base, ms, status, count in results:
+            self.stdout.write(f"{base:<6} {ms:>8.1f} {count:>6}  {status}")
+        self.stdout.write(
+            f"Warmed {len(results)} base currenc{'y' if len(results) == 1 else 'ies'} "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return sum(1 for result in results if result[2].startswith('failed'))
@@ -0,0 +1,69 @@
+"""
+Trip membership checks: is a user the owner or a tripmate of a trip?
+
+Answers come from one indexed EXISTS (or one query for a batch of trips)
+instead of loading the tripmate list, and are memoized on the request's
+user object, so repeated checks within a request cost nothing.
+"""
+
+# Attribute on the user instance holding {trip_id: allowed}; request.user
+# lives exactly as long as the request, so the cache does too
+CACHE_ATTR = '_trip_membership'
+
+
+def _cache(user):
+    cache = getattr(user, CACHE_ATTR, None)
+    if cache is None:
+        cache = {}
+        setattr(user, CACHE_ATTR, cache)
+    return cache
+
+
+def _tripmate_rows(user):
+    from .models import Trip
+    return Trip.tripmate.through.objects.filter(customuser_id=user.pk)
+
+
+def is_trip_member(user, trip):
+    """True if `user` owns or is a tripmate of `trip`"""
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    if trip.user_id == user.pk:
+        return True
+
+    cache = _cache(user)
+    if trip.pk not in cache:
+        cache[trip.pk] = _tripmate_rows(user).filter(trip_id=trip.pk).exists()
+    return cache[trip.pk]
+
+
+async def ais_trip_member(user, trip):
+    """Async is_trip_member, sharing its per-request cache"""
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    if trip.user_id == user.pk:
+        return True
+
+    cache = _cache(user)
+    if trip.pk not in cache:
+        cache[trip.pk] = await _tripmate_rows(user).filter(trip_id=trip.pk).aexists()
+    return cache[trip.pk]
+
+
+def allowed_trip_ids(user, trip_ids):
+    """The subset of `trip_ids` the user owns or is a tripmate of, in one query"""
+    from .models import Trip
+    if not getattr(user, 'is_authenticated', False):
+        return set()
+
+    cache = _cache(user)
+    trip_ids = set(trip_ids)
+    unknown = trip_ids - set(cache)
+    if unknown:
+        allowed = set(
+            Trip.objects.accessible_by(user).filter(pk__in=unknown).values_list('pk', flat=True)
+        )
+        for trip_id in unknown:
+            cache[trip_id] = trip_id in allowed
+    return {trip_id for trip_id in trip_ids if cache[trip_id]}
+
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['trip', 'date', 'amount'], name='expense_trip_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['trip', 'category', 'amount'], name='expense_trip_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['user', 'start_date'], name='trip_user_start_idx'),
+        ),
+        # Tripmate lookups filter the auto-created M2M table by customuser_id;
+        # this index serves them without touching the table itself.
+        migrations.RunSQL(
+            sql='CREATE INDEX trip_tripmate_user_trip_idx ON api_trip_tripmate (customuser_id, trip_id)',
+            reverse_sql='DROP INDEX trip_tripmate_user_trip_idx',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    # Build rollups for expenses created before the table existed
+    Expense = apps.get_model('api', 'Expense')
+    TripSpendingRollup = apps.get_model('api', 'TripSpendingRollup')
+    buckets = (
+        Expense.objects.values('trip_id', 'date', 'category', currency=F('original_currency'))
+        .annotate(total=Sum('amount'), expense_count=Count('id'))
+        .order_by()
+    )
+    TripSpendingRollup.objects.bulk_create(
+        (TripSpendingRollup(**row) for row in buckets), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSpendingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(choices=[('food', 'Food & Dining'), ('transport', 'Transport'), ('accommodation', 'Accommodation'), ('entertainment', 'Entertainment'), ('other', 'Other')], max_length=20)),
+                ('currency', models.CharField(max_length=3)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spending_rollups', to='api.trip')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trip', 'date', 'category', 'currency'), name='rollup_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_trip_spending_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
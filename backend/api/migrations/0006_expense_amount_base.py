@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_unbased(apps, schema_editor):
+    # Expenses written so far have no base amount until the backfill runs
+    TripSpendingRollup = apps.get_model('api', 'TripSpendingRollup')
+    TripSpendingRollup.objects.update(unbased_count=F('expense_count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_trip_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='base_rate',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='base_rate_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tripspendingrollup',
+            name='total_base',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='tripspendingrollup',
+            name='unbased_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(mark_existing_unbased, migrations.RunPython.noop),
+    ]
@@ -15,6 +15,8 @@ Lines reused specified below
 """
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.db import models
+from django.utils import timezone
+from .membership import is_trip_member
 
 #REUSED FROM Very Academy (LINE 22-61)
 
@@ -61,6 +63,21 @@ class CustomUser(AbstractBaseUser):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
 # TRIP MODEL 
+def _accessible_trip_ids(user):
+    # Owned ids UNION ALL tripmate ids, each half read from its own index
+    # (trip_user_start_idx, trip_tripmate_user_trip_idx). Used inside IN,
+    # which is a semi-join, so an id in both halves still matches one row.
+    owned = Trip.objects.filter(user_id=user.pk).values('pk')
+    shared = Trip.tripmate.through.objects.filter(customuser_id=user.pk).values('trip_id')
+    return owned.union(shared, all=True)
+
+
+class TripQuerySet(models.QuerySet):
+    def accessible_by(self, user):
+        """Trips the user owns or is a tripmate of, each once, without DISTINCT"""
+        return self.filter(pk__in=_accessible_trip_ids(user))
+
+
 class Trip(models.Model):
     """
     Can be shared with other users (tripmates) for collaborative trips.
@@ -82,16 +99,42 @@ class Trip(models.Model):
     savings = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     tripmate = models.ManyToManyField(CustomUser, related_name="collaborated_trips", blank=True)
     currency = models.CharField(max_length=3, default='GBP')
+    # Bumped whenever the trip, its expenses or its tripmates change; keys cached analytics
+    data_version = models.PositiveIntegerField(default=0)
+    # Set together with data_version; Last-Modified of single-trip responses
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TripQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Trip list: owner's trips ordered by start date
+            models.Index(fields=["user", "start_date"], name="trip_user_start_idx"),
+        ]
 
     def __str__(self):
         return f"{self.trip_name} ({self.destination})"
 
     def is_user_allowed(self, user):
-        """Check if user is owner or tripmate"""
-        return self.user == user or user in self.tripmate.all()
+        """Check if user is owner or tripmate (one EXISTS query, memoized per request)"""
+        return is_trip_member(user, self)
+
+    @staticmethod
+    def bump_data_version(*trip_ids):
+        """Invalidate cached analytics and ETags of the given trips"""
+        Trip.objects.filter(pk__in=trip_ids).update(
+            data_version=models.F('data_version') + 1,
+            updated_at=timezone.now(),
+        )
     
 
 # EXPENSE MODEL 
+class ExpenseQuerySet(models.QuerySet):
+    def accessible_by(self, user):
+        """Expenses on trips the user owns or is a tripmate of, without DISTINCT"""
+        return self.filter(trip_id__in=_accessible_trip_ids(user))
+
+
 class Expense(models.Model):
     """
     Individual expense within a trip.
@@ -112,5 +155,71 @@ class Expense(models.Model):
     description = models.TextField(blank=True, null=True)
     original_currency = models.CharField(max_length=3, default='GBP')  # Currency of the user who added the expense
 
+    # Amount in settings.EXPENSE_BASE_CURRENCY, fixed at write time (api/base_amounts.py),
+    # with the rate snapshot used. Null while no rate was available.
+    amount_base = models.DecimalField(max_digits=16, decimal_places=4, null=True, blank=True)
+    base_rate = models.DecimalField(max_digits=20, decimal_places=10, null=True, blank=True)
+    base_rate_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ExpenseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Daily series and date-ordered lists; amount makes SUMs index-only
+            models.Index(fields=["trip", "date", "amount"], name="expense_trip_date_idx"),
+            # Category breakdowns
+            models.Index(fields=["trip", "category", "amount"], name="expense_trip_category_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.category}: {self.amount} on {self.date}"
+
+# SPENDING ROLLUP MODEL
+class TripSpendingRollup(models.Model):
+    """
+    Running spending totals per trip, day, category and currency, maintained
+    alongside every expense write (see api/rollups.py) so analytics read
+    O(categories + days) rows instead of every expense.
+    """
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="spending_rollups")
+    date = models.DateField()
+    category = models.CharField(max_length=20, choices=Expense.CATEGORY_CHOICES)
+    currency = models.CharField(max_length=3)  # Expense.original_currency of the summed rows
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    # Sum of Expense.amount_base, and how many expenses in the bucket have none
+    total_base = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    unbased_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["trip", "date", "category", "currency"], name="rollup_unique_bucket"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.trip_id} {self.date} {self.category}: {self.total} {self.currency}"
+
+# EXCHANGE RATE HISTORY MODEL
+class ExchangeRate(models.Model):
+    """
+    Daily rate snapshots (one row per date, base and quote currency), ingested
+    by `manage.py ingest_exchange_rates` so conversions can use the rate of an
+    expense's date without the network (see api/rate_history.py).
+    """
+    date = models.DateField()
+    base = models.CharField(max_length=3)
+    quote = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=20, decimal_places=10)  # 1 base = rate quote
+    # Set on every (re-)ingest; the latest one versions cached conversions
+    ingested_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            # Also serves "latest rate on or before a date" lookups
+            models.UniqueConstraint(fields=["base", "quote", "date"], name="exchange_rate_unique_day"),
+        ]
+
     def __str__(self):
-        return f"{self.category}: {self.amount} on {self.date}"
\ No newline at end of file
+        return f"{self.date} 1 {self.base} = {self.rate} {self.quote}"
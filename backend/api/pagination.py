@@ -0,0 +1,109 @@
+"""
+Keyset (cursor) pagination for the trip and expense lists.
+
+Pages are selected with WHERE (key, id) > (last_key, last_id) rather than an
+OFFSET, so fetching a deep page costs the same as the first one and cursors
+stay stable while rows are added. Clients that send neither `cursor` nor
+`page_size` still get the full unpaginated list.
+"""
+
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginates on (`key_field`, id) in ascending order"""
+    key_field = None
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'KEYSET_PAGE_SIZE', 100)
+        max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 1000)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+            if requested > 0:
+                page_size = requested
+        except (KeyError, ValueError):
+            pass
+        return min(page_size, max_page_size)
+
+    def encode_cursor(self, instance):
+        key = getattr(instance, self.key_field)
+        payload = json.dumps([str(key), instance.pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            key, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            field = queryset.model._meta.get_field(self.key_field)
+            return field.to_python(key), int(pk)
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            # Backwards compatible: no pagination parameters, whole list
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(self.key_field, 'pk')
+
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            key, pk = self.decode_cursor(queryset, cursor)
+            queryset = queryset.filter(
+                Q(**{f"{self.key_field}__gt": key}) |
+                Q(**{self.key_field: key, 'pk__gt': pk})
+            )
+
+        # Fetch one extra row to know whether there is a next page
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ExpenseKeysetPagination(KeysetPagination):
+    key_field = 'date'
+
+
+class TripKeysetPagination(KeysetPagination):
+    key_field = 'start_date'
@@ -0,0 +1,145 @@
+"""
+Historical exchange rates kept in the database (the ExchangeRate table).
+
+Snapshots are ingested with `manage.py ingest_exchange_rates`, from JSON files
+or from a live provider on a schedule. Expense base amounts are converted at
+the rate of the expense's date: RateHistory loads every stored rate a batch
+of expenses can need, for its whole date range, in one query and answers
+lookups from memory. StoredRateProvider serves the latest stored tables to
+the exchange rate service, so with it configured as EXCHANGE_RATE_PROVIDER
+the app converts without any network access.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .exchange_rates import ExchangeRateError
+from .models import ExchangeRate
+
+RATE_PLACES = Decimal('0.0000000001')
+
+
+def lookback_days():
+    # How old the latest snapshot on or before a date may be (weekends, holidays)
+    return getattr(settings, 'EXCHANGE_RATE_HISTORY_LOOKBACK_DAYS', 7)
+
+
+def store_rates(day, base, table):
+    """
+    Insert or replace the rates of one base currency's table for `day`.
+    Stamps them with the ingest time, which moves history_version() on.
+    """
+    ingested_at = timezone.now()
+    rows = [
+        ExchangeRate(
+            date=day, base=base, quote=quote, rate=Decimal(str(rate)).quantize(RATE_PLACES), ingested_at=ingested_at,
+        )
+        for quote, rate in table.items() if quote != base
+    ]
+    ExchangeRate.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['base', 'quote', 'date'], update_fields=['rate', 'ingested_at'],
+    )
+    return len(rows)
+
+
+def history_version():
+    """
+    Time of the latest ingest (None before any), shared by every process
+    through the database. Cached conversions and ETags include it, so
+    ingesting rates invalidates them like a trip's data_version does.
+    """
+    return ExchangeRate.objects.aggregate(latest=Max('ingested_at'))['latest']
+
+
+async def ahistory_version():
+    """Async history_version"""
+    return (await ExchangeRate.objects.aaggregate(latest=Max('ingested_at')))['latest']
+
+
+def _quote(table, base, currency):
+    return Decimal(1) if currency == base else table.get(currency)
+
+
+class RateHistory:
+    """Stored rate tables per (base, date), answering 'rate on or before a date' lookups"""
+
+    def __init__(self, rows):
+        self._tables = defaultdict(dict)  # (base, date) -> {quote: rate}
+        dates = defaultdict(set)
+        for day, base, quote, rate in rows:
+            self._tables[(base, day)][quote] = rate
+            dates[base].add(day)
+        self._dates = {base: sorted(days) for base, days in dates.items()}
+        self._lookback = timedelta(days=lookback_days())
+
+    @staticmethod
+    def _rows(currencies, start, end):
+        return ExchangeRate.objects.filter(
+            quote__in=currencies, date__range=(start - timedelta(days=lookback_days()), end),
+        ).values_list('date', 'base', 'quote', 'rate')
+
+    @classmethod
+    def load(cls, currencies, start, end):
+        """One query for every stored rate quoting `currencies` that lookups between start and end can use"""
+        return cls(cls._rows(currencies, start, end))
+
+    @classmethod
+    async def aload(cls, currencies, start, end):
+        """Async load"""
+        return cls([row async for row in cls._rows(currencies, start, end)])
+
+    def _latest(self, base, day):
+        # (date, table) of the latest table for `base` on or before `day`
+        dates = self._dates.get(base, [])
+        index = bisect_right(dates, day)
+        if not index or day - dates[index - 1] > self._lookback:
+            return None
+        return dates[index - 1], self._tables[(base, dates[index - 1])]
+
+    def rate(self, from_currency, to_currency, day):
+        """
+        Decimal rate from `from_currency` to `to_currency` on `day`, or None
+        if nothing is stored. Uses the most recent table quoting both
+        currencies: direct, inverse or a cross rate through another base.
+        """
+        if from_currency == to_currency:
+            return Decimal(1)
+        best = None
+        for base in dict.fromkeys([from_currency, to_currency, *sorted(self._dates)]):
+            found = self._latest(base, day)
+            if found is None:
+                continue
+            table_day, table = found
+            from_rate = _quote(table, base, from_currency)
+            to_rate = _quote(table, base, to_currency)
+            if from_rate and to_rate and (best is None or table_day > best[0]):
+                best = (table_day, to_rate / from_rate)
+        return best[1] if best else None
+
+
+class StoredRateProvider:
+    """
+    Rate provider reading the latest stored table for a base currency, or
+    deriving it from the latest table of another base that quotes it.
+    """
+
+    def fetch(self, base):
+        latest = ExchangeRate.objects.filter(base=base).order_by('-date').values_list('date', flat=True).first()
+        if latest is not None:
+            rows = ExchangeRate.objects.filter(base=base, date=latest).values_list('quote', 'rate')
+            return {quote: float(rate) for quote, rate in rows}
+
+        pivot = ExchangeRate.objects.filter(quote=base).order_by('-date').values_list('base', 'date').first()
+        if pivot is None:
+            raise ExchangeRateError(f"No stored rates for {base}")
+        pivot_base, day = pivot
+        table = dict(ExchangeRate.objects.filter(base=pivot_base, date=day).values_list('quote', 'rate'))
+        table[pivot_base] = Decimal(1)
+        base_rate = table[base]
+        return {quote: float(rate / base_rate) for quote, rate in table.items() if quote != base}
@@ -0,0 +1,126 @@
+"""
+Exchange rate cache warming.
+
+warm_rates() refreshes the rate table of every currency in use (users'
+display currencies, trip currencies and expense currencies) through a small
+thread pool, so user requests find the tables cached instead of paying for
+a live fetch after each TTL expiry. It runs from
+`manage.py warm_rate_cache`, once or on a loop, or in a background thread of
+each web process (EXCHANGE_RATE_WARMING), which is what a per-process cache
+such as the default LocMemCache needs.
+
+Rounds repeat every EXCHANGE_RATE_TTL minus EXCHANGE_RATE_WARM_MARGIN
+seconds, so every table is refreshed before it expires.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from .exchange_rates import ExchangeRateError, get_rate_service
+from .models import CustomUser, Trip, TripSpendingRollup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MARGIN = 300
+MIN_INTERVAL = 60
+
+
+def currencies_in_use():
+    """Distinct currencies of users, trips and expenses"""
+    currencies = set(CustomUser.objects.values_list('currency', flat=True).distinct())
+    currencies.update(Trip.objects.values_list('currency', flat=True).distinct())
+    # Same currencies as Expense.original_currency, from far fewer rows
+    currencies.update(TripSpendingRollup.objects.values_list('currency', flat=True).distinct())
+    currencies.discard('')
+    return sorted(currencies)
+
+
+def _refresh(service, base):
+    # One pool task: (base, milliseconds, status, number of rates)
+    started = time.perf_counter()
+    try:
+        entry = service.refresh_table(base)
+        status = 'stale' if entry.get('stale') else 'ok'
+        count = len(entry['rates'])
+    except ExchangeRateError as e:
+        status, count = f"failed: {str(e)}", 0
+    finally:
+        # Pool threads would otherwise keep their database connections open
+        connection.close()
+    return base, (time.perf_counter() - started) * 1000, status, count
+
+
+def warm_rates(currencies=None, workers=None, service=None):
+    """
+    Refresh the rate tables of `currencies` (default: all in use) with at
+    most `workers` fetches at a time. Returns (base, ms, status, rate count)
+    per base currency, in the order given.
+    """
+    service = service or get_rate_service()
+    currencies = currencies if currencies is not None else currencies_in_use()
+    workers = workers or getattr(settings, 'EXCHANGE_RATE_WARM_WORKERS', DEFAULT_WORKERS)
+    if not currencies:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(currencies))) as pool:
+        return list(pool.map(lambda base: _refresh(service, base), currencies))
+
+
+def warm_interval(service=None):
+    """Seconds between rounds, so each table is refreshed before its TTL runs out"""
+    service = service or get_rate_service()
+    margin = getattr(settings, 'EXCHANGE_RATE_WARM_MARGIN', DEFAULT_MARGIN)
+    return max(service.ttl - margin, MIN_INTERVAL)
+
+
+def _log_round(results):
+    for base, ms, status, count in results:
+        if status == 'ok':
+            logger.info(f"Warmed {base} rates ({count}) in {ms:.0f} ms")
+        else:
+            logger.warning(f"Warming {base} rates: {status} after {ms:.0f} ms")
+
+
+class RateWarmer(threading.Thread):
+    """Daemon thread running warm_rates() every warm_interval() seconds until stopped"""
+
+    def __init__(self, interval=None, workers=None):
+        super().__init__(name='rate-warmer', daemon=True)
+        self.interval = interval
+        self.workers = workers
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                _log_round(warm_rates(workers=self.workers))
+            except Exception as e:
+                # Keep warming on the next round, e.g. after a database hiccup
+                logger.error(f"Rate warming round failed: {str(e)}")
+            finally:
+                connection.close()
+            self._stop_event.wait(self.interval or warm_interval())
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def start_background_warming():
+    """Start this process's RateWarmer if EXCHANGE_RATE_WARMING is on; safe to call repeatedly"""
+    global _warmer
+    if not getattr(settings, 'EXCHANGE_RATE_WARMING', False):
+        return None
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = RateWarmer()
+            _warmer.start()
+    return _warmer
@@ -0,0 +1,88 @@
+"""
+In-process LRU cache for analytics responses.
+
+Entries are keyed by (endpoint, user, viewing currency, trip data versions,
+stored rate history version). Trip.data_version is bumped whenever a trip,
+its expenses or its tripmates change, and the history version whenever
+rates are ingested, so a change simply produces a new key and old entries
+age out of the LRU. Each entry also expires when the earliest exchange-rate table
+used to build it expires, so converted numbers never outlive the rate TTL;
+results converted with stale fallback rates are not cached at all.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .exchange_rates import track_rate_usage
+
+
+class LRUResponseCache:
+    """Thread-safe, size-bounded LRU mapping of key -> (expires_at, data)"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data, expires_at=None):
+        with self._lock:
+            self._entries[key] = (expires_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+analytics_cache = LRUResponseCache(getattr(settings, 'ANALYTICS_CACHE_MAX_ENTRIES', 1000))
+
+
+def cached_analytics(key, build):
+    """
+    Return the cached result for `key`, or call `build()` and cache what it
+    returns until the earliest rate table it converted with expires.
+    None results (e.g. "no trips") and results built from stale rates are
+    not cached.
+    """
+    data = analytics_cache.get(key)
+    if data is not None:
+        return data
+
+    with track_rate_usage() as usage:
+        data = build()
+    if data is not None and not usage.stale:
+        analytics_cache.set(key, data, usage.expires_at)
+    return data
+
+
+async def acached_analytics(key, build):
+    """cached_analytics for an async `build` coroutine function"""
+    data = analytics_cache.get(key)
+    if data is not None:
+        return data
+
+    with track_rate_usage() as usage:
+        data = await build()
+    if data is not None and not usage.stale:
+        analytics_cache.set(key, data, usage.expires_at)
+    return data
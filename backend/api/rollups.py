@@ -0,0 +1,166 @@
+"""
+Maintenance of TripSpendingRollup.
+
+Every expense create, update and delete applies its amount to the matching
+(trip, date, category, currency) bucket with an atomic F() update inside the
+same transaction as the write, so concurrent tripmate writes never lose an
+increment. Buckets also sum the expenses' base-currency amounts and count the
+expenses that have none (see api/base_amounts.py). rebuild_rollups() and
+verify_rollups() recompute the table from raw expenses.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Expense, TripSpendingRollup
+
+
+def _bucket(expense):
+    return {
+        'trip_id': expense.trip_id,
+        'date': expense.date,
+        'category': expense.category,
+        'currency': expense.original_currency,
+    }
+
+
+def snapshot(expense):
+    """Copy of the fields the rollup depends on, taken before an update"""
+    return Expense(
+        trip_id=expense.trip_id,
+        date=expense.date,
+        category=expense.category,
+        original_currency=expense.original_currency,
+        amount=expense.amount,
+        amount_base=expense.amount_base,
+    )
+
+
+def _base_delta(expense, sign):
+    # (total_base, unbased_count) contribution of one expense
+    if expense.amount_base is None:
+        return Decimal('0'), sign
+    return sign * Decimal(expense.amount_base), 0
+
+
+def apply_delta(bucket, amount, count, base_amount=0, unbased=0):
+    """Add the amounts and counts to a bucket, creating it if needed"""
+    rows = TripSpendingRollup.objects.filter(**bucket)
+    changes = {
+        'total': F('total') + amount,
+        'expense_count': F('expense_count') + count,
+        'total_base': F('total_base') + base_amount,
+        'unbased_count': F('unbased_count') + unbased,
+    }
+    updated = rows.update(**changes)
+    if not updated:
+        try:
+            # Savepoint so a concurrent insert of the same bucket can be retried
+            with transaction.atomic():
+                TripSpendingRollup.objects.create(
+                    total=amount, expense_count=count, total_base=base_amount, unbased_count=unbased, **bucket
+                )
+        except IntegrityError:
+            rows.update(**changes)
+    if count < 0:
+        rows.filter(expense_count__lte=0).delete()
+
+
+def record_created(expense):
+    apply_delta(_bucket(expense), expense.amount, 1, *_base_delta(expense, 1))
+
+
+def record_deleted(expense):
+    apply_delta(_bucket(expense), -expense.amount, -1, *_base_delta(expense, -1))
+
+
+def record_updated(before, expense):
+    """`before` is a snapshot() of the expense taken before it was saved"""
+    if _bucket(before) == _bucket(expense):
+        if before.amount != expense.amount or before.amount_base != expense.amount_base:
+            base_after, unbased_after = _base_delta(expense, 1)
+            base_before, unbased_before = _base_delta(before, 1)
+            apply_delta(
+                _bucket(expense), expense.amount - before.amount, 0,
+                base_after - base_before, unbased_after - unbased_before,
+            )
+        return
+    record_deleted(before)
+    record_created(expense)
+
+
+def record_batch(expenses):
+    """Apply many newly created expenses with one update per bucket"""
+    totals = defaultdict(lambda: [Decimal('0'), 0, Decimal('0'), 0])
+    for expense in expenses:
+        key = tuple(_bucket(expense).items())
+        base_amount, unbased = _base_delta(expense, 1)
+        totals[key][0] += Decimal(expense.amount)
+        totals[key][1] += 1
+        totals[key][2] += base_amount
+        totals[key][3] += unbased
+    for key, deltas in totals.items():
+        apply_delta(dict(key), *deltas)
+
+
+def _expense_buckets(trip_ids=None):
+    expenses = Expense.objects.all()
+    if trip_ids is not None:
+        expenses = expenses.filter(trip_id__in=trip_ids)
+    return (
+        expenses.values('trip_id', 'date', 'category', currency=F('original_currency'))
+        .annotate(
+            total=Sum('amount'),
+            expense_count=Count('id'),
+            total_base=Coalesce(
+                Sum('amount_base'), Value(Decimal('0')),
+                output_field=DecimalField(max_digits=18, decimal_places=4),
+            ),
+            unbased_count=Count('id', filter=Q(amount_base__isnull=True)),
+        )
+        .order_by()
+    )
+
+
+def rebuild_rollups(trip_ids=None, batch_size=1000):
+    """Recompute rollups from raw expenses, for all trips or only `trip_ids`"""
+    with transaction.atomic():
+        rollups = TripSpendingRollup.objects.all()
+        if trip_ids is not None:
+            rollups = rollups.filter(trip_id__in=trip_ids)
+        rollups.delete()
+        created = TripSpendingRollup.objects.bulk_create(
+            (TripSpendingRollup(**row) for row in _expense_buckets(trip_ids)),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def verify_rollups(trip_ids=None):
+    """Return (bucket, expected, actual) for every bucket that disagrees with the expenses"""
+    def key(row):
+        return (row['trip_id'], row['date'], row['category'], row['currency'])
+
+    def sums(row):
+        return (row['total'], row['expense_count'], row['total_base'], row['unbased_count'])
+
+    expected = {key(row): sums(row) for row in _expense_buckets(trip_ids)}
+    rollups = TripSpendingRollup.objects.all()
+    if trip_ids is not None:
+        rollups = rollups.filter(trip_id__in=trip_ids)
+    actual = {
+        key(row): sums(row)
+        for row in rollups.values(
+            'trip_id', 'date', 'category', 'currency', 'total', 'expense_count', 'total_base', 'unbased_count'
+        )
+    }
+
+    mismatches = []
+    for bucket in sorted(expected.keys() | actual.keys(), key=str):
+        if expected.get(bucket) != actual.get(bucket):
+            mismatches.append((bucket, expected.get(bucket), actual.get(bucket)))
+    return mismatches
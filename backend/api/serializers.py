@@ -9,9 +9,11 @@ Serilizer for user inspired by this video
 
 from rest_framework import serializers
 from .models import CustomUser, Trip, Expense
+from django.db import models
 from django.utils import timezone
-from django.core.cache import cache
-import requests
+from .exchange_rates import get_rate_service, apply_rate, ExchangeRateError
+from .instrumentation import timed
+from .base_amounts import base_amount, base_amount_fields, money, ExpenseConverter
 
 # USER SERIALIZER
 class UserSerializer(serializers.ModelSerializer):
@@ -45,8 +47,54 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("A user with this email already exists.")
         return value.lower()
 
+# CURRENCY CONVERSION
+class RateMemoListSerializer(serializers.ListSerializer):
+    """
+    Resolves every exchange rate a page of rows needs in one step, then lets
+    each row convert from that in-memory table instead of a cache lookup
+    (and, on a miss, an HTTP request) per row.
+    """
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        request = self.context.get('request')
+
+        if request:
+            self.child.rate_memo = self.child.memo_rates(instances, request.user.currency)
+        try:
+            return [self.child.to_representation(item) for item in instances]
+        finally:
+            self.child.rate_memo = None
+
+
+class RateMemoMixin:
+    """Converts from the list serializer's rate memo when one is set"""
+    rate_memo = None
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+    def memo_rates(self, instances, to_currency):
+        currencies = {self.get_source_currency(item) for item in instances}
+        currencies.discard(to_currency)
+        return get_rate_service().get_rates(currencies, to_currency)
+
+    def convert_amount(self, amount, from_currency, to_currency):
+        if self.rate_memo is None:
+            return get_rate_service().convert(amount, from_currency, to_currency)
+        if from_currency not in self.rate_memo:
+            raise ExchangeRateError(f"No exchange rate available for {from_currency}")
+        return apply_rate(amount, self.rate_memo[from_currency])
+
 # TRIP SERIALIZER
-class TripSerializer(serializers.ModelSerializer):
+class TripSerializer(RateMemoMixin, serializers.ModelSerializer):
     user_id = serializers.IntegerField(source='user.id', read_only=True)
     
     class Meta:
@@ -55,6 +103,10 @@ class TripSerializer(serializers.ModelSerializer):
             "id", "user_id", "trip_name", "destination", "start_date", "end_date",
             "total_budget", "traveler_type", "savings", "currency"
         ]
+        list_serializer_class = RateMemoListSerializer
+
+    def get_source_currency(self, instance):
+        return instance.currency
 
     def validate(self, data):
         start_date = data.get("start_date")
@@ -75,7 +127,7 @@ class TripSerializer(serializers.ModelSerializer):
             # Only convert if the viewing user's currency is different from the trip's currency
             if user.currency != instance.currency:
                 try:
-                    converted_amount = self.convert_currency(
+                    converted_amount = self.convert_amount(
                         float(data['total_budget']),
                         instance.currency,
                         user.currency
@@ -89,39 +141,28 @@ class TripSerializer(serializers.ModelSerializer):
                 
         return data
 
-    def convert_currency(self, amount, from_currency, to_currency):
-        if from_currency == to_currency:
-            return amount
-            
-        cache_key = f"exchange_rate_{from_currency}_{to_currency}"
-        try:
-            if cached_rate := cache.get(cache_key):
-                return round(amount * cached_rate, 2)
-                
-            response = requests.get(
-                f"https://api.exchangerate-api.com/v4/latest/{from_currency}",
-                timeout=5
-            )
-            response.raise_for_status()
-            data = response.json()
-            rate = data['rates'].get(to_currency, 1)
-            cache.set(cache_key, rate, timeout=3600)
-            return round(amount * rate, 2)
-            
-        except requests.RequestException:
-            return amount
-
 # EXPENSE SERIALIZER
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(RateMemoMixin, serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = ["id", "trip", "amount", "date", "category", "description", "original_currency"]
+        list_serializer_class = RateMemoListSerializer
+
+    def get_source_currency(self, instance):
+        return instance.original_currency
+
+    def memo_rates(self, instances, to_currency):
+        # Expenses convert at the rate of their own date, like analytics and exports
+        return ExpenseConverter.for_expenses(instances, to_currency)
 
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             # Set to current user's currency when creating
             validated_data['original_currency'] = request.user.currency
+        validated_data.update(base_amount_fields(
+            validated_data['amount'], validated_data.get('original_currency', 'GBP'), validated_data['date']
+        ))
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
@@ -129,6 +170,15 @@ class ExpenseSerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user'):
              # Update to current user's currency when editing
             validated_data['original_currency'] = request.user.currency
+
+        amount = validated_data.get('amount', instance.amount)
+        currency = validated_data.get('original_currency', instance.original_currency)
+        day = validated_data.get('date', instance.date)
+        if currency == instance.original_currency and day == instance.date and instance.base_rate is not None:
+            # Same currency and date: keep the rate snapshot taken when the expense was created
+            validated_data['amount_base'] = base_amount(amount, instance.base_rate)
+        else:
+            validated_data.update(base_amount_fields(amount, currency, day))
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
@@ -139,43 +189,18 @@ class ExpenseSerializer(serializers.ModelSerializer):
             user = request.user
             # Only convert if the viewing user's currency is different from the expense's original currency
             if user.currency != instance.original_currency:
-                try:
-                    converted_amount = self.convert_currency(
-                        float(data['amount']),
-                        instance.original_currency,
-                        user.currency
-                    )
+                converter = self.rate_memo or ExpenseConverter.for_expenses([instance], user.currency)
+                converted_amount, currency = converter.convert(
+                    instance.amount, instance.original_currency, instance.date, instance.amount_base
+                )
+                # If no rate is available, keep original amount
+                if currency == user.currency:
                     data['original_amount'] = data['amount']
                     data['original_currency'] = instance.original_currency
-                    data['amount'] = converted_amount
-                except Exception as e:
-                     # If conversion fails, keep original amount
-                    pass
+                    data['amount'] = float(money(converted_amount))
                 
         return data
 
-    def convert_currency(self, amount, from_currency, to_currency):
-        if from_currency == to_currency:
-            return amount
-            
-        cache_key = f"exchange_rate_{from_currency}_{to_currency}"
-        try:
-            if cached_rate := cache.get(cache_key):
-                return round(amount * cached_rate, 2)
-                
-            response = requests.get(
-                f"https://api.exchangerate-api.com/v4/latest/{from_currency}",
-                timeout=5
-            )
-            response.raise_for_status()
-            data = response.json()
-            rate = data['rates'].get(to_currency, 1)
-            cache.set(cache_key, rate, timeout=3600)
-            return round(amount * rate, 2)
-            
-        except requests.RequestException:
-            return amount
-
 # TRIPMATE SERIALIZER
 class TripmateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,6 +1,6 @@
 
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path("trips/", views.TripListCreate.as_view(), name="trip-list"),
@@ -11,7 +11,17 @@ urlpatterns = [
     path("expenses/", views.ExpenseListCreate.as_view(), name="expense-list"),
     path("expenses/<int:pk>/", views.ExpenseDeleteView.as_view(), name="expense-delete"),
     path("expenses/<int:pk>/update/", views.ExpenseUpdateView.as_view(), name="expense-update"),
+    path("trips/<int:trip_id>/expenses/import/", views.ExpenseImportView.as_view(), name="expense-import"),
+    path("trips/<int:trip_id>/expenses/export/", views.ExpenseExportView.as_view(), name="trip-expense-export"),
+    path("expenses/export/", views.ExpenseExportView.as_view(), name="expense-export"),
+    path("trips/export/", views.TripExportView.as_view(), name="trip-export"),
     path("budget-recommendation/", views.BudgetRecommendationView.as_view(), name="budget-recommendation"),
+    path("budget-recommendation/batch/", views.BatchBudgetRecommendationView.as_view(), name="budget-recommendation-batch"),
+    path("cities/", views.CitySearchView.as_view(), name="city-search"),
     path('trips/<int:trip_id>/tripmate/', views.TripTripmateView.as_view(), name='trip-tripmate'),
     path('users/verify/', views.UserVerificationView.as_view(), name='user-verify'),
+    # Async versions for ASGI deployments (api/async_views.py)
+    path("async/trips/analytics/", async_views.AsyncAllTripsAnalyticsView.as_view(), name="async-all-trips-analytics"),
+    path("async/trips/<int:trip_id>/analytics/", async_views.AsyncTripAnalyticsView.as_view(), name="async-trip-analytics"),
+    path("async/budget-recommendation/", async_views.AsyncBudgetRecommendationView.as_view(), name="async-budget-recommendation"),
 ]
\ No newline at end of file
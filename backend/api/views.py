@@ -13,24 +13,27 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import CustomUser, Trip, Expense
 from .serializers import UserSerializer, TripSerializer, ExpenseSerializer, TripmateSerializer
-from django.db.models import Sum, Q  # Added Q here
-from datetime import timedelta
-import requests
-from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from .analytics import all_trips_analytics, trip_analytics, spending_series
+from .pagination import TripKeysetPagination, ExpenseKeysetPagination
+from . import rollups
+from .response_cache import cached_analytics
+from .conditional import accessible_trips_conditional, trip_conditional
+from .budget import recommend_budget, recommend_budgets, budget_validation_error, search_cities, CityNotFound, BUDGET_FIELDS, MAX_BATCH_ITEMS, TRAVELER_MULTIPLIERS
+from .cost_data import CostDataUnavailable
+from .imports import import_expenses, parse_csv, parse_ndjson
+from .rate_history import history_version
+from .exports import expense_rows, trip_rates, trip_rows, export_response, EXPENSE_FIELDS, TRIP_FIELDS, CONTENT_TYPES
+from decimal import Decimal
 import logging
 from rest_framework.generics import UpdateAPIView, DestroyAPIView, RetrieveAPIView
 from django.contrib.auth.hashers import check_password
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import AuthenticationFailed, NotFound
 from django.contrib.auth import get_user_model
-from collections import defaultdict
-import json
-from django.conf import settings
-import os
-
-# Load cost of living data from JSON file
-with open(os.path.join(settings.BASE_DIR, '../frontend/src/data/cost_of_living_indices.json'), 'r') as f:
-    cost_of_living_data = json.load(f)
+import csv
+import hashlib
 
 logger = logging.getLogger(__name__)
 
@@ -42,18 +45,19 @@ def calculate_trip_analytics(trip):
     - Category breakdowns
     - Daily spending patterns
     """
-    # Get expenses for the trip (works for both owners and tripmate)
-    expenses = trip.expenses.all()
-    total_spent = expenses.aggregate(total=Sum('amount'))['total'] or 0
+    # Read the trip's spending rollup (works for both owners and tripmate)
+    spending = trip.spending_rollups.all()
     duration = (trip.end_date - trip.start_date).days + 1
     
 
-    # Groups expenses by category and adds up how much was spent in each.
-    category_data = expenses.values('category').annotate(total=Sum('amount'))
+    # Groups spending by category and adds up how much was spent in each.
+    category_data = list(spending.values('category').annotate(total=Sum('total')).order_by())
     category_dict = {
         item['category']: float(item['total'])
         for item in category_data
     }
+    # Total comes from the category sums, saving a separate aggregate query
+    total_spent = sum((item['total'] for item in category_data), Decimal('0'))
     
     # All categories are listed, even if unused
     expected_categories = ['food', 'transport', 'accommodation', 'entertainment', 'other']
@@ -72,20 +76,9 @@ def calculate_trip_analytics(trip):
         'remaining_budget': float(trip.total_budget - total_spent),
         'daily_average': float(total_spent) / duration if duration > 0 else 0,
         'category_spending': category_dict, 
-        'daily_spending': _get_daily_spending(trip)
+        'daily_spending': spending_series(trip, 'day')
     }
 
-def _get_daily_spending(trip):
-    """Generate daily spending breakdown between trip dates"""
-    daily_data = {}
-    current_date = trip.start_date
-    while current_date <= trip.end_date:
-        daily_total = trip.expenses.filter(date=current_date).aggregate(
-            total=Sum('amount'))['total'] or 0
-        daily_data[current_date.strftime("%Y-%m-%d")] = float(daily_total)
-        current_date += timedelta(days=1)
-    return daily_data
-
 # CORE USER VIEWS
 #REUSED FROM Tech with Tim (LINE 91-95) and followed same format throughout
 class CreateUserView(generics.CreateAPIView):
@@ -183,19 +176,29 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             raise AuthenticationFailed("User not found")
         
 # TRIP MANAGEMENT VIEWS 
+@accessible_trips_conditional()
 class TripListCreate(generics.ListCreateAPIView):
     serializer_class = TripSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TripKeysetPagination
     
     #User's trips and any shared trips added to as a tripmate.
     def get_queryset(self):
         user = self.request.user
-        return Trip.objects.filter(
-            Q(user=user) | Q(tripmate=user)
-        ).distinct().prefetch_related('tripmate')
+        return Trip.objects.accessible_by(user).prefetch_related('tripmate')
 
     def perform_create(self, serializer):
         """ assigns trip creator as trip owner and sets to their preferred currency"""
+        data = serializer.validated_data
+        error = budget_validation_error(
+            data['total_budget'],
+            data['destination'],
+            data.get('traveler_type', 'medium'),
+            (data['end_date'] - data['start_date']).days + 1,
+            self.request.user.currency
+        )
+        if error:
+            raise serializers.ValidationError({"error": error})
         serializer.save(user=self.request.user, currency=self.request.user.currency)
 
     def get_serializer_context(self):
@@ -224,47 +227,32 @@ class TripUpdateView(generics.UpdateAPIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Proceed with update validation
-            traveler_type = request.data.get('traveler_type', instance.traveler_type)
-            requested_budget = float(request.data.get('total_budget', instance.total_budget))
-            
-            # Get budget recommendation for validation
-            try:
-                # Calculate duration for the trip
-                start_date = request.data.get('start_date', instance.start_date)
-                end_date = request.data.get('end_date', instance.end_date)
-                duration = (end_date - start_date).days + 1
-                
-                # Get recommendation for the traveler type
-                response = requests.post(
-                    "http://localhost:8000/api/budget-recommendation/",
-                    json={
-                        'city': request.data.get('destination', instance.destination),
-                        'traveler_type': traveler_type,
-                        'duration': duration
-                    },
-                    headers={'Authorization': f'Bearer {request.auth}'}
+            serializer = self.get_serializer(instance, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+
+            # Validate the budget against the in-process recommendation, only
+            # when the update changes something the budget is checked against
+            data = serializer.validated_data
+            if BUDGET_FIELDS & data.keys():
+                start_date = data.get('start_date', instance.start_date)
+                end_date = data.get('end_date', instance.end_date)
+                traveler_type = data.get('traveler_type', instance.traveler_type)
+                error = budget_validation_error(
+                    data.get('total_budget', instance.total_budget),
+                    data.get('destination', instance.destination),
+                    traveler_type,
+                    (end_date - start_date).days + 1,
+                    request.user.currency
                 )
-                
-                if response.status_code == 200:
-                    recommended_data = response.json()
-                    max_allowed = recommended_data['total_budget'] * 1.5
-                    min_allowed = recommended_data['total_budget'] * 0.5
-                    
-                    if not (min_allowed <= requested_budget <= max_allowed):
-                        return Response(
-                            {"error": f"Budget must be within 50% of recommended {traveler_type} budget ({recommended_data['total_budget']:.2f} {recommended_data['currency']})"},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                        
-            except Exception as e:
-                logger.error(f"Budget validation error: {str(e)}")
-                
+                if error:
+                    return Response(
+                        {"error": error},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
             
             # Perform the update
-            serializer = self.get_serializer(instance, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
             self.perform_update(serializer)
+            Trip.bump_data_version(instance.id)
             
             return Response(serializer.data)
             
@@ -306,23 +294,26 @@ class TripDeleteView(generics.DestroyAPIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 # EXPENSE MANAGEMENT VIEWS 
+@accessible_trips_conditional()
 class ExpenseListCreate(generics.ListCreateAPIView):
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ExpenseKeysetPagination
 
     def get_queryset(self):
-        return Expense.objects.filter(
-             #Only include those related to trips where the current user is either the user or the tripmate. 
-            Q(trip__user=self.request.user) | 
-            Q(trip__tripmate=self.request.user)
-        ).distinct()
+        #Only include those related to trips where the current user is either the user or the tripmate. 
+        return Expense.objects.accessible_by(self.request.user)
 
     def perform_create(self, serializer):
         #Checks if the user has permission to add expenses to the trip. 
         trip = serializer.validated_data['trip']
         if not trip.is_user_allowed(self.request.user):
             raise serializers.ValidationError("You can only add expenses to trips you own or collaborate on.")
-        serializer.save()
+        # Save and update the trip's spending rollup in one transaction
+        with transaction.atomic():
+            expense = serializer.save()
+            rollups.record_created(expense)
+            Trip.bump_data_version(expense.trip_id)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -335,10 +326,7 @@ class ExpenseUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Expense.objects.filter(
-            Q(trip__user=self.request.user) | 
-            Q(trip__tripmate=self.request.user)
-        ).distinct()
+        return Expense.objects.accessible_by(self.request.user)
 
     def perform_update(self, serializer):
          #checks if the user is allowed to modify the expense
@@ -347,7 +335,17 @@ class ExpenseUpdateView(generics.UpdateAPIView):
             raise serializers.ValidationError(
                 "You can only update expenses for trips you own or collaborate on."
             )
-        serializer.save()
+        with transaction.atomic():
+            # Lock and re-read the row so concurrent edits apply their rollup
+            # deltas one after the other, each from the state it replaces
+            locked = Expense.objects.select_for_update().filter(pk=serializer.instance.pk).first()
+            if locked is None:
+                raise NotFound("Expense not found.")
+            serializer.instance = locked
+            before = rollups.snapshot(locked)
+            expense = serializer.save()
+            rollups.record_updated(before, expense)
+            Trip.bump_data_version(before.trip_id, expense.trip_id)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -361,10 +359,7 @@ class ExpenseDeleteView(generics.DestroyAPIView):
 
     def get_queryset(self):
         #Allow deletion for trip owners and tripmate
-        return Expense.objects.filter(
-            Q(trip__user=self.request.user) | 
-            Q(trip__tripmate=self.request.user)
-        ).distinct()
+        return Expense.objects.accessible_by(self.request.user)
 
     def perform_destroy(self, instance):
         #checks if the user is allowed to delete the expense
@@ -372,119 +367,129 @@ class ExpenseDeleteView(generics.DestroyAPIView):
             raise serializers.ValidationError(
                 "You can only delete expenses for trips you own or collaborate on."
             )
-        instance.delete()
+        with transaction.atomic():
+            # Lock and re-read the row; only the request that actually removes
+            # it takes its amount out of the rollup
+            locked = Expense.objects.select_for_update().filter(pk=instance.pk).first()
+            if locked is None:
+                return
+            deleted, _ = Expense.objects.filter(pk=locked.pk).delete()
+            if deleted:
+                rollups.record_deleted(locked)
+                Trip.bump_data_version(locked.trip_id)
+
+class ExpenseImportView(APIView):
+    #Endpoint for bulk importing expenses into a trip from CSV or NDJSON
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, trip_id):
+        trip = get_object_or_404(Trip, id=trip_id)
+        if not trip.is_user_allowed(request.user):
+            return Response(
+                {"error": "You can only add expenses to trips you own or collaborate on."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # Read the upload line by line: a multipart file (spooled to disk by
+        # Django when large) or the raw request body stream
+        content_type = request.content_type or ''
+        if content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({"error": "A file is required"}, status=status.HTTP_400_BAD_REQUEST)
+            stream, name = upload, upload.name or ''
+        else:
+            stream, name = request.stream, ''
+            if stream is None:
+                return Response({"error": "Request body is empty"}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_type = request.query_params.get('type')
+        if not file_type:
+            is_csv = 'csv' in content_type or name.lower().endswith('.csv')
+            file_type = 'csv' if is_csv else 'ndjson'
+        if file_type not in ('csv', 'ndjson'):
+            return Response({"error": "type must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = parse_csv(stream) if file_type == 'csv' else parse_ndjson(stream)
+        try:
+            result = import_expenses(trip, request.user, rows)
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({"error": f"Could not read upload: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result['failed'] and not result['created']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        if result['failed']:
+            return Response(result, status=status.HTTP_200_OK)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+def _export_type(request):
+    # "format" is reserved by DRF for renderer selection, so use "type"
+    file_type = request.query_params.get('type', 'csv')
+    return file_type if file_type in CONTENT_TYPES else None
+
+class ExpenseExportView(APIView):
+    #Endpoint for streaming all of a user's expenses, or one trip's, as CSV or NDJSON
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, trip_id=None):
+        file_type = _export_type(request)
+        if file_type is None:
+            return Response({"error": "type must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if trip_id is not None:
+            trip = get_object_or_404(Trip, id=trip_id)
+            if not trip.is_user_allowed(request.user):
+                return Response(
+                    {"error": "Not authorized to export this trip's expenses"},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            expenses = Expense.objects.filter(trip=trip)
+            filename = f"trip-{trip.id}-expenses"
+        else:
+            expenses = Expense.objects.accessible_by(request.user)
+            filename = "expenses"
+
+        # Rates are resolved chunk by chunk as the response streams
+        rows = expense_rows(expenses, request.user.currency)
+        return export_response(rows, EXPENSE_FIELDS, file_type, filename)
+
+class TripExportView(APIView):
+    #Endpoint for streaming the user's owned and shared trips as CSV or NDJSON
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        file_type = _export_type(request)
+        if file_type is None:
+            return Response({"error": "type must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        trips = Trip.objects.accessible_by(request.user)
+        # Rates are resolved here, before the response starts streaming
+        rows = trip_rows(trips, request.user.currency, trip_rates(trips, request.user.currency))
+        return export_response(rows, TRIP_FIELDS, file_type, "trips")
         
 # ANALYTICS VIEWS 
+@accessible_trips_conditional()
 class AllTripsAnalyticsView(APIView):
     #Endpoint for aggregated analytics across all trips
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         try:
-            # Get both owned and collaborated trips
-            trips = Trip.objects.filter(
-                Q(user=request.user) | Q(tripmate=request.user)
-            ).distinct()
-            
-            if not trips.exists():
+            # Cached per (user, currency, versions of every accessible trip)
+            versions = Trip.objects.accessible_by(request.user).order_by('id').values_list('id', 'data_version')
+            cache_key = (
+                'all_trips', request.user.id, request.user.currency, history_version(),
+                hashlib.sha1(repr(list(versions)).encode()).hexdigest()
+            )
+
+            # Grouped SQL aggregation, converted once per currency group
+            response_data = cached_analytics(cache_key, lambda: all_trips_analytics(request.user))
+            if response_data is None:
                 return Response(
                     {"error": "No trips found for this user"},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            response_data = {
-                'total_budget': 0,
-                'total_spent': 0,
-                'remaining_budget': 0,
-                'categories': defaultdict(float),
-                'daily_spending': defaultdict(float),
-                'trips': [],
-                'user_currency': request.user.currency,
-                'is_converted': False
-            }
-
-            # Process each trip
-            for trip in trips:
-                trip_data = {
-                    'trip_id': trip.id,
-                    'trip_name': trip.trip_name,
-                    'destination': trip.destination,
-                    'start_date': trip.start_date.strftime("%Y-%m-%d"),
-                    'end_date': trip.end_date.strftime("%Y-%m-%d"),
-                    'total_budget': float(trip.total_budget),
-                    'total_spent': 0,
-                    'remaining_budget': 0,
-                    'daily_average': 0,
-                    'category_spending': defaultdict(float),
-                    'is_converted': False
-                }
-
-                # Convert trip budget if needed
-                if request.user.currency != trip.currency:
-                    converted_budget = self.convert_currency(
-                        trip_data['total_budget'],
-                        trip.currency,
-                        request.user.currency
-                    )
-                    if converted_budget is not None:
-                        trip_data['total_budget'] = converted_budget
-                        trip_data['is_converted'] = True
-                        response_data['is_converted'] = True
-
-                # Process all expenses for this trip
-                expenses = trip.expenses.all()
-                for expense in expenses:
-                    amount = float(expense.amount)
-                    
-                    # Convert amount if needed
-                    if request.user.currency != expense.original_currency:
-                        converted_amount = self.convert_currency(
-                            amount,
-                            expense.original_currency,
-                            request.user.currency
-                        )
-                        if converted_amount is not None:
-                            amount = converted_amount
-                            trip_data['is_converted'] = True
-                            response_data['is_converted'] = True
-                    
-                    trip_data['total_spent'] += amount
-                    trip_data['category_spending'][expense.category] += amount
-                    
-                    date_str = expense.date.strftime("%Y-%m-%d")
-                    response_data['daily_spending'][date_str] += amount
-                    trip_data['daily_spending'] = trip_data.get('daily_spending', {})
-                    trip_data['daily_spending'][date_str] = trip_data['daily_spending'].get(date_str, 0) + amount
-
-                # Calculate remaining budget and daily average
-                trip_data['remaining_budget'] = trip_data['total_budget'] - trip_data['total_spent']
-                duration = (trip.end_date - trip.start_date).days + 1
-                trip_data['daily_average'] = trip_data['total_spent'] / duration if duration > 0 else 0
-                
-                # Round trip data
-                trip_data['total_budget'] = round(trip_data['total_budget'], 2)
-                trip_data['total_spent'] = round(trip_data['total_spent'], 2)
-                trip_data['remaining_budget'] = round(trip_data['remaining_budget'], 2)
-                trip_data['daily_average'] = round(trip_data['daily_average'], 2)
-                trip_data['category_spending'] = {k: round(v, 2) for k, v in trip_data['category_spending'].items()}
-                
-                # Add to totals
-                response_data['total_budget'] += trip_data['total_budget']
-                response_data['total_spent'] += trip_data['total_spent']
-                
-                # Aggregate category spending
-                for category, amount in trip_data['category_spending'].items():
-                    response_data['categories'][category] += amount
-                
-                response_data['trips'].append(trip_data)
-
-            # Calculate remaining budget and round all values
-            response_data['remaining_budget'] = round(response_data['total_budget'] - response_data['total_spent'], 2)
-            response_data['total_budget'] = round(response_data['total_budget'], 2)
-            response_data['total_spent'] = round(response_data['total_spent'], 2)
-            response_data['categories'] = {k: round(v, 2) for k, v in response_data['categories'].items()}
-            response_data['daily_spending'] = {k: round(v, 2) for k, v in response_data['daily_spending'].items()}
-
             return Response(response_data, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -493,30 +498,8 @@ class AllTripsAnalyticsView(APIView):
                 {"error": "Could not generate analytics"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-    def convert_currency(self, amount, from_currency, to_currency):
-        if from_currency == to_currency:
-            return amount
-            
-        cache_key = f"exchange_rate_{from_currency}_{to_currency}"
-        try:
-            if cached_rate := cache.get(cache_key):
-                return round(amount * cached_rate, 2)
-                
-            response = requests.get(
-                f"https://api.exchangerate-api.com/v4/latest/{from_currency}",
-                timeout=5
-            )
-            response.raise_for_status()
-            data = response.json()
-            rate = data['rates'].get(to_currency, 1)
-            cache.set(cache_key, rate, timeout=3600)
-            return round(amount * rate, 2)
-            
-        except requests.RequestException as e:
-            logger.error(f"Currency conversion failed: {str(e)}")
-            return None
         
+@trip_conditional()
 class TripAnalyticsView(APIView):
     #Endpoint for detailed analytics of a specific trip
     permission_classes = [IsAuthenticated]
@@ -532,63 +515,10 @@ class TripAnalyticsView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Initialize data structures
-            category_spending = defaultdict(float)
-            daily_spending = defaultdict(float)
-            total_spent = 0.0
-            
-            # Get all expenses and convert each one
-            expenses = trip.expenses.all()
-            for expense in expenses:
-                amount = float(expense.amount)
-                
-                # Convert amount if needed
-                if request.user.currency != expense.original_currency:
-                    converted_amount = self.convert_currency(
-                        amount,
-                        expense.original_currency,
-                        request.user.currency
-                    )
-                    if converted_amount is not None:
-                        amount = converted_amount
-                
-                total_spent += amount
-                category_spending[expense.category] += amount
-                date_str = expense.date.strftime("%Y-%m-%d")
-                daily_spending[date_str] += amount
-            
-            # Convert trip budget if needed
-            total_budget = float(trip.total_budget)
-            if request.user.currency != trip.currency:
-                converted_budget = self.convert_currency(
-                    total_budget,
-                    trip.currency,
-                    request.user.currency
-                )
-                if converted_budget is not None:
-                    total_budget = converted_budget
-            
-            # Calculate duration and daily average
-            duration = (trip.end_date - trip.start_date).days + 1
-            daily_avg = total_spent / duration if duration > 0 else 0
-            
-            # Prepare response data
-            analytics_data = {
-                'trip_id': trip.id,
-                'trip_name': trip.trip_name,
-                'destination': trip.destination,
-                'start_date': trip.start_date.strftime("%Y-%m-%d"),
-                'end_date': trip.end_date.strftime("%Y-%m-%d"),
-                'total_budget': round(total_budget, 2),
-                'total_spent': round(total_spent, 2),
-                'remaining_budget': round(total_budget - total_spent, 2),
-                'daily_average': round(daily_avg, 2),
-                'category_spending': {k: round(v, 2) for k, v in category_spending.items()},
-                'daily_spending': {k: round(v, 2) for k, v in daily_spending.items()},
-                'user_currency': request.user.currency,
-                'trip_currency': trip.currency,
-                'is_converted': request.user.currency != trip.currency
-            }
+            # Read the per-day/category rollup rather than every expense,
+            # cached until the trip or the stored rates change or its live rates expire
+            cache_key = ('trip', trip.id, trip.data_version, request.user.id, request.user.currency, history_version())
+            analytics_data = cached_analytics(cache_key, lambda: trip_analytics(trip, request.user))
             
             return Response(analytics_data)
             
@@ -603,29 +533,6 @@ class TripAnalyticsView(APIView):
                 {"error": "Could not generate trip analytics"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-    def convert_currency(self, amount, from_currency, to_currency):
-        if from_currency == to_currency:
-            return amount
-            
-        cache_key = f"exchange_rate_{from_currency}_{to_currency}"
-        try:
-            if cached_rate := cache.get(cache_key):
-                return round(amount * cached_rate, 2)
-                
-            response = requests.get(
-                f"https://api.exchangerate-api.com/v4/latest/{from_currency}",
-                timeout=5
-            )
-            response.raise_for_status()
-            data = response.json()
-            rate = data['rates'].get(to_currency, 1)
-            cache.set(cache_key, rate, timeout=3600)
-            return round(amount * rate, 2)
-            
-        except requests.RequestException as e:
-            logger.error(f"Currency API error: {str(e)}")
-            return None
         
 # BUDGET RECOMMENDATION VIEW 
 class BudgetRecommendationView(APIView):
@@ -646,61 +553,17 @@ class BudgetRecommendationView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Load cost data from JSON
-            cost_data = self._get_city_cost_data(city)
-            if not cost_data:
+            # Price the trip in-process with the shared engine
+            user_currency = getattr(request.user, 'currency', 'GBP')
+            try:
+                recommendation = recommend_budget(city, traveler_type, duration, user_currency)
+            except CityNotFound as e:
                 return Response(
-                    {"error": f"Cost data not available for {city}. Please try a major city."},
+                    {"error": str(e)},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Calculate adjusted costs based on traveler type
-            multipliers = {
-                "luxury": 1.8,
-                "medium": 1.0,
-                "budget": 0.6
-            }
-            
-            # Use directly from the JSON data
-            daily_costs = {
-                'food and dining': (cost_data['groceries_index'] + cost_data['restaurant_index']) / 2,  # Average of both
-                'accommodation': cost_data['rent_index'],
-                'general': cost_data['index'],
-                'entertainment': cost_data['purchasing_index']
-            }
-            
-            # Apply traveler type multiplier to relevant categories
-            adjusted_costs = {
-                'food and dining': daily_costs['food and dining'] * multipliers.get(traveler_type, 1.0),
-                'accommodation': daily_costs['accommodation'] * multipliers.get(traveler_type, 1.0),
-                'general': daily_costs['general'] * multipliers.get(traveler_type, 1.0),
-                'entertainment': daily_costs['entertainment'] * multipliers.get(traveler_type, 1.0),
-            }
-
-            # Convert to user's currency if needed
-            user_currency = getattr(request.user, 'currency', 'GBP')
-            converted_costs = self._convert_currency(
-                adjusted_costs,
-                cost_data['currency_type'],
-                user_currency
-            )
-
-            # Calculate totals
-            daily_total = sum(converted_costs.values())  # Sum ALL categories
-            total_budget = round(daily_total * duration, 2)
-            converted_costs = {k: round(v, 2) for k, v in converted_costs.items()}
-
-            return Response({
-                'city': city,
-                'daily_breakdown': converted_costs,
-                'daily_total': round(daily_total, 2),
-                'total_budget': total_budget,
-                'currency': user_currency,
-                'traveler_type': traveler_type,
-                'duration_days': duration,
-                'source_currency': cost_data['currency_type'],
-                'is_converted': user_currency != cost_data['currency_type']
-            })
+            return Response(recommendation)
 
         except Exception as e:
             logger.error(f"Budget recommendation error: {str(e)}")
@@ -709,52 +572,88 @@ class BudgetRecommendationView(APIView):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-    def _get_city_cost_data(self, city):
-        #Fetch cost of living data from JSON data
-        # Try to find the city in data 
-        city_lower = city.lower()
-        
-        # First try exact match
-        for city_name, data in cost_of_living_data.items():
-            if city_lower == city_name.lower():
-                return data
-                
-        # If not found, try to find a partial match
-        for city_name, data in cost_of_living_data.items():
-            if city_lower in city_name.lower():
-                return data
-                
-        return None
+def _batch_items(data):
+    # Either an explicit list of items or a cities x traveler_types x durations grid
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    if 'items' in data:
+        items = data['items']
+        if not isinstance(items, list):
+            raise ValueError("items must be a list")
+    else:
+        cities = data.get('cities') or []
+        traveler_types = data.get('traveler_types') or ['medium']
+        durations = data.get('durations') or [7]
+        for name, values in (('cities', cities), ('traveler_types', traveler_types), ('durations', durations)):
+            if not isinstance(values, list):
+                raise ValueError(f"{name} must be a list")
+        if len(cities) * len(traveler_types) * len(durations) > MAX_BATCH_ITEMS:
+            raise ValueError(f"At most {MAX_BATCH_ITEMS} items can be priced per request")
+        items = [
+            {'city': city, 'traveler_type': traveler_type, 'duration': duration}
+            for city in cities for traveler_type in traveler_types for duration in durations
+        ]
+
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('city'):
+            raise ValueError("Every item needs a city")
+        traveler_type = item.get('traveler_type', 'medium')
+        if not isinstance(traveler_type, str) or traveler_type not in TRAVELER_MULTIPLIERS:
+            raise ValueError(f"traveler_type must be one of {', '.join(TRAVELER_MULTIPLIERS)}")
+        parsed.append({
+            'city': str(item['city']),
+            'traveler_type': traveler_type,
+            'duration': int(item.get('duration', 7)),
+        })
+    return parsed
 
-    def _convert_currency(self, costs, from_currency, to_currency):
-        #Convert costs to user's preferred currency
-        if from_currency == to_currency:
-            return costs
+class BatchBudgetRecommendationView(APIView):
+    #Budget recommendations for many cities, traveler types and durations in one call
+    permission_classes = [IsAuthenticated]
 
-        cache_key = f"exchange_rate_{from_currency}_{to_currency}"
+    def post(self, request):
         try:
-            # Try to get cached rate first
-            if cached_rate := cache.get(cache_key):
-                return {k: round(v * cached_rate, 2) for k, v in costs.items()}
+            items = _batch_items(request.data)
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            response = requests.get(
-                f"https://api.exchangerate-api.com/v4/latest/{from_currency}",
-                timeout=5
+        if not items:
+            return Response({"error": "No cities to price"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH_ITEMS:
+            return Response(
+                {"error": f"At most {MAX_BATCH_ITEMS} items can be priced per request"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            response.raise_for_status()
-            data = response.json()
-            rate = data['rates'].get(to_currency)
 
-            if not rate:
-                raise Exception(f"No exchange rate available for {to_currency}")
+        try:
+            user_currency = getattr(request.user, 'currency', 'GBP')
+            return Response({'results': recommend_budgets(items, user_currency)})
+        except Exception as e:
+            logger.error(f"Batch budget recommendation error: {str(e)}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
-            # Cache rate for 1 hour
-            cache.set(cache_key, rate, timeout=3600)
-            return {k: round(v * rate, 2) for k, v in costs.items()}
+class CitySearchView(APIView):
+    #City autocomplete backed by the cost of living index
+    permission_classes = [IsAuthenticated]
 
-        except Exception as e:
-            logger.error(f"Currency conversion failed: {str(e)}")
-            raise Exception("Currency conversion service unavailable. Using original values.")
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = max(min(int(request.query_params.get('limit', 10)), 50), 1)
+        except ValueError:
+            limit = 10
+        try:
+            return Response({'results': search_cities(query, limit) if query else []})
+        except CostDataUnavailable as e:
+            logger.error(f"City search error: {str(e)}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         
 class TripTripmateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -802,6 +701,7 @@ class TripTripmateView(APIView):
                 return Response({'detail': 'You cannot add yourself as a tripmate'}, status=400)
             
             trip.tripmate.add(user_to_add)
+            Trip.bump_data_version(trip.id)
             
             return Response({
                 'status': 'success',
@@ -826,6 +726,7 @@ class TripTripmateView(APIView):
         try:
             user_to_remove = CustomUser.objects.get(email=email)
             trip.tripmate.remove(user_to_remove)
+            Trip.bump_data_version(trip.id)
             return Response({'detail': 'tripmate removed successfully'}, status=200)
         except CustomUser.DoesNotExist:
             return Response({'detail': 'User not found'}, status=404)
@@ -55,6 +55,10 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Keyset pagination for trip and expense lists (api/pagination.py), used when
+# a request sends ?cursor= or ?page_size=
+KEYSET_PAGE_SIZE = 100
+KEYSET_MAX_PAGE_SIZE = 1000
 
 #REUSED FROM Tech with Tim (LINE 60-63)
 SIMPLE_JWT = {
@@ -78,6 +82,7 @@ INSTALLED_APPS = [
 
 #REUSED FROM Tech with Tim (LINE 88)
 MIDDLEWARE = [
+    "api.instrumentation.ServerTimingMiddleware",  # first, so its total covers the whole request
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -171,3 +176,57 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWS_CREDENTIALS = True
 
+
+# Exchange rates (see api/exchange_rates.py)
+# Use "api.exchange_rates.FileRateProvider" with EXCHANGE_RATE_FILE, or
+# "api.rate_history.StoredRateProvider" with ingested rates, to run without the HTTP API
+EXCHANGE_RATE_PROVIDER = "api.exchange_rates.HTTPRateProvider"
+EXCHANGE_RATE_API_URL = os.environ.get("EXCHANGE_RATE_API_URL", "https://api.exchangerate-api.com/v4/latest/{base}")
+EXCHANGE_RATE_FILE = os.environ.get("EXCHANGE_RATE_FILE")
+EXCHANGE_RATE_TTL = 3600  # seconds a base currency's rate table stays cached
+EXCHANGE_RATE_TIMEOUT = 5  # seconds per HTTP rate request
+# After this many consecutive fetch failures the provider is not called for
+# EXCHANGE_RATE_COOLDOWN seconds; a failed base currency is not retried for
+# EXCHANGE_RATE_NEGATIVE_TTL seconds. Meanwhile the last good table, kept for
+# EXCHANGE_RATE_STALE_TTL seconds, is served and flagged as stale.
+EXCHANGE_RATE_FAILURE_THRESHOLD = 5
+EXCHANGE_RATE_COOLDOWN = 30
+EXCHANGE_RATE_NEGATIVE_TTL = 60
+EXCHANGE_RATE_STALE_TTL = 7 * 24 * 3600
+
+# Cache warming (api/rate_warming.py): refresh the tables of all currencies in
+# use EXCHANGE_RATE_WARM_MARGIN seconds before they expire, with at most
+# EXCHANGE_RATE_WARM_WORKERS concurrent fetches. EXCHANGE_RATE_WARMING runs it
+# in a background thread of every web process (needed with a per-process cache);
+# otherwise run `manage.py warm_rate_cache --loop` next to a shared cache.
+EXCHANGE_RATE_WARMING = os.environ.get("EXCHANGE_RATE_WARMING", "") == "1"
+EXCHANGE_RATE_WARM_MARGIN = 300
+EXCHANGE_RATE_WARM_WORKERS = 4
+
+# Currency of Expense.amount_base (api/base_amounts.py). Changing it needs
+# `manage.py backfill_expense_base_amounts --all` followed by a rollup rebuild.
+EXPENSE_BASE_CURRENCY = "GBP"
+
+# Expenses are converted at the latest ingested rate (`manage.py ingest_exchange_rates`)
+# on or before their date, if it is at most this many days old; otherwise at today's rate
+EXCHANGE_RATE_HISTORY_LOOKBACK_DAYS = 7
+
+# Cost of living indices (api/cost_data.py), loaded on first use. The optional
+# snapshot is written by `manage.py compile_cost_data` and is used when it
+# matches the JSON source or the source is missing.
+COST_OF_LIVING_FILE = BASE_DIR.parent / "frontend" / "src" / "data" / "cost_of_living_indices.json"
+COST_OF_LIVING_SNAPSHOT = os.environ.get("COST_OF_LIVING_SNAPSHOT")
+
+# Rows per bulk_create/transaction in the expense import endpoint
+EXPENSE_IMPORT_BATCH_SIZE = 1000
+
+# Rows fetched per database round-trip by the streaming export endpoints
+EXPORT_CHUNK_SIZE = 2000
+
+# Per-process LRU cache of analytics responses (api/response_cache.py)
+ANALYTICS_CACHE_MAX_ENTRIES = 1000
+
+# Per-request metrics (api/instrumentation.py): every response gets a
+# Server-Timing header; requests taking at least this many ms are also logged
+# as one JSON line on the "api.performance" logger
+PERFORMANCE_LOG_MIN_MS = 0
@@ -0,0 +1,34 @@
+"""
+Settings profile for the endpoint benchmarks (`manage.py benchmark_endpoints`).
+
+Same as settings.py but on a throwaway SQLite database, so the benchmark can
+flush and regenerate its synthetic data freely and runs without PostgreSQL.
+
+    python manage.py benchmark_endpoints --settings=backend.settings_benchmark
+"""
+
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+BENCHMARK_PROFILE = True
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get(
+            'BENCHMARK_DATABASE', os.path.join(tempfile.gettempdir(), 'smarttravel_benchmark.sqlite3')
+        ),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Rates come from the benchmark's in-process provider, never the network
+EXCHANGE_RATE_PROVIDER = "api.benchmark_data.BenchmarkRateProvider"
+
+DEBUG = False
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Background exchange rate cache warming, if EXCHANGE_RATE_WARMING is on
+from api.rate_warming import start_background_warming  # noqa: E402
+
+start_background_warming()